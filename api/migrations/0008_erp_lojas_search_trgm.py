@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+# Campos do filtro "q" de GET /api/lojas (icontains em cada um, combinados com OR).
+SEARCH_COLUMNS = ("codigo", "razao_social", "nome_fantasia", "cidade", "estado")
+
+
+def create_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        # O icontains do Django gera UPPER(col::text) LIKE UPPER(...): o índice
+        # precisa ser na mesma expressão, e todos os ramos do OR precisam de
+        # índice para o planner usar BitmapOr em vez de varrer a tabela.
+        for column in SEARCH_COLUMNS:
+            cursor.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS erp_lojas_{column}_upper_trgm
+                ON erp_lojas USING gin ((UPPER({column}::text)) gin_trgm_ops);
+                """
+            )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        for column in SEARCH_COLUMNS:
+            cursor.execute(f"DROP INDEX IF EXISTS erp_lojas_{column}_upper_trgm;")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_planopagamentocliente_dias_primeira_parcela"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
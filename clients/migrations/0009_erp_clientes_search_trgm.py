@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+# Filtro de GET /api/clientes/search: ILIKE '%q%' em cada coluna, combinados com OR.
+SEARCH_TABLES = ("erp_clientes", "erp_clientes_vendedores")
+SEARCH_COLUMNS = ("cliente_razao_social", "cliente_nome_fantasia", "cliente_cnpj_cpf")
+
+
+def create_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        for table in SEARCH_TABLES:
+            cursor.execute("SELECT to_regclass(%s);", [table])
+            if cursor.fetchone()[0] is None:
+                continue
+            # Um índice por coluna: com todos os ramos do OR indexados o planner
+            # usa BitmapOr em vez de varrer a tabela.
+            for column in SEARCH_COLUMNS:
+                cursor.execute(
+                    f"""
+                    CREATE INDEX IF NOT EXISTS {table}_{column}_trgm
+                    ON {table} USING gin ({column} gin_trgm_ops);
+                    """
+                )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        for table in SEARCH_TABLES:
+            for column in SEARCH_COLUMNS:
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clients", "0008_clientesync"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_nome_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('erp_clientes_vendedores');")
+        if cursor.fetchone()[0] is None:
+            return
+        # O vínculo do login com o vendedor busca lower(btrim(vendedor_nome)) por
+        # igualdade e por prefixo (LIKE 'nome%'); text_pattern_ops atende os dois.
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_erp_clientes_vendedores_nome_lower
+            ON erp_clientes_vendedores (lower(btrim(vendedor_nome)) text_pattern_ops);
+            """
+        )
+
+
+def drop_nome_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS idx_erp_clientes_vendedores_nome_lower;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clients", "0009_erp_clientes_search_trgm"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_nome_index, reverse_code=drop_nome_index),
+    ]
@@ -301,13 +301,18 @@ def fetch_nfe_documents_for_cnpj(
 	last_nsu: Optional[str] = None,
 	nsu: Optional[str] = None,
 	access_key: Optional[str] = None,
+	config: Optional[SefazConfiguration] = None,
 ) -> NFeDistributionResult:
-	"""Consult NF-e documents issued against the informed CNPJ using the configured A1 certificate."""
+	"""Consult NF-e documents issued against the informed CNPJ using the configured A1 certificate.
+
+	Callers that already loaded the SEFAZ configuration can pass it in ``config``.
+	"""
 	clean_cnpj = normalize_cnpj(cnpj)
 	if len(clean_cnpj) != 14:
 		raise ValueError('CNPJ inválido.')
 
-	config = SefazConfiguration.load()
+	if config is None:
+		config = SefazConfiguration.load()
 	if not config:
 		raise NFeDistributionError('Configuração SEFAZ não encontrada.')
 
@@ -369,7 +374,7 @@ def prepare_company_nfe_query(
 			sanitized_params['access_key'] = access_key
 			if len(access_key) != 44:
 				raise ValueError('A chave de acesso deve conter 44 dígitos.')
-			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, access_key=access_key)
+			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, access_key=access_key, config=config)
 		elif raw_nsu:
 			nsu = _digits_only(raw_nsu)
 			sanitized_params['nsu'] = nsu
@@ -377,11 +382,11 @@ def prepare_company_nfe_query(
 				raise ValueError('Informe um NSU válido.')
 			if len(nsu) > 15:
 				raise ValueError('O NSU deve ter no máximo 15 dígitos.')
-			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, nsu=nsu)
+			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, nsu=nsu, config=config)
 		else:
 			last_nsu = _digits_only(raw_last_nsu)
 			sanitized_params['last_nsu'] = last_nsu
-			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, last_nsu=last_nsu or None)
+			result = fetch_nfe_documents_for_cnpj(company.tax_id, state_code=state_code, last_nsu=last_nsu or None, config=config)
 	except ValueError as exc:
 		return sanitized_params, None, str(exc), sefaz_ready
 	except NFeDistributionError as exc:
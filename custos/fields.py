@@ -0,0 +1,55 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django import forms
+from django.core import exceptions, validators
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class PercentBpsField(models.IntegerField):
+	"""Percentual com duas casas decimais gravado como inteiro (centésimos de ponto).
+
+	No Python o valor continua sendo um ``Decimal`` (ex.: ``Decimal('4.50')``);
+	no banco é gravado ``450``. Aceita até 9999,99%, o mesmo intervalo do
+	``DecimalField(max_digits=6, decimal_places=2)`` que substitui.
+	"""
+
+	description = 'Percentual armazenado em centésimos de ponto percentual'
+	default_error_messages = {
+		'invalid': _('“%(value)s” value must be a decimal number.'),
+	}
+	max_digits = 6
+	decimal_places = 2
+	default_validators = [validators.DecimalValidator(max_digits, decimal_places)]
+
+	def from_db_value(self, value, expression, connection):
+		if value is None:
+			return value
+		return Decimal(int(value)).scaleb(-self.decimal_places)
+
+	def to_python(self, value):
+		if value is None or isinstance(value, Decimal):
+			return value
+		try:
+			return Decimal(str(value).strip().replace(',', '.'))
+		except (InvalidOperation, ValueError):
+			raise exceptions.ValidationError(
+				self.error_messages['invalid'],
+				code='invalid',
+				params={'value': value},
+			)
+
+	def get_prep_value(self, value):
+		value = models.Field.get_prep_value(self, value)
+		if value is None:
+			return None
+		value = self.to_python(value)
+		return int(value.scaleb(self.decimal_places).to_integral_value(rounding=ROUND_HALF_UP))
+
+	def formfield(self, **kwargs):
+		return models.Field.formfield(self, **{
+			'form_class': forms.DecimalField,
+			'max_digits': self.max_digits,
+			'decimal_places': self.decimal_places,
+			**kwargs,
+		})
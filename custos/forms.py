@@ -1,8 +1,12 @@
+import re
+
 from django import forms
 
-from .models import CostBatch, CostBatchItem, CostParameter
+from .models import COST_PARAMETER_KEY_PATTERN, CostBatch, CostBatchItem, CostParameter
 from products.models import SupplierProductPrice
 
+_CODES_SPLIT_RE = re.compile(r'[,;\n]+')
+
 
 class CostParameterForm(forms.ModelForm):
 	class Meta:
@@ -18,12 +22,18 @@ class CostParameterForm(forms.ModelForm):
 		]
 		widgets = {
 			'label': forms.TextInput(attrs={'class': 'input'}),
-			'key': forms.TextInput(attrs={'class': 'input', 'pattern': r'[a-z0-9\-]+'}),
+			# Validação do campo vem do modelo (validate_cost_parameter_key).
+			'key': forms.TextInput(attrs={'class': 'input', 'pattern': COST_PARAMETER_KEY_PATTERN}),
 			'value': forms.NumberInput(attrs={'class': 'input', 'step': '0.0001'}),
 			'unit': forms.TextInput(attrs={'class': 'input'}),
 			'description': forms.Textarea(attrs={'class': 'textarea', 'rows': 3}),
 		}
 
+	def clean_key(self):
+		# O modelo grava em minúsculas; normalizar aqui faz a checagem de
+		# unicidade valer para "Frete" e "frete".
+		return self.cleaned_data['key'].strip().lower()
+
 
 class SupplierCostForm(forms.ModelForm):
 	class Meta:
@@ -78,7 +88,8 @@ class CostBatchAddItemsForm(forms.Form):
 
 	def clean_codes(self):
 		raw = self.cleaned_data['codes']
-		parts = [part.strip() for part in raw.replace(';', ',').replace('\n', ',').split(',') if part.strip()]
+		parts = [part.strip() for part in _CODES_SPLIT_RE.split(raw) if part.strip()]
 		if not parts:
 			raise forms.ValidationError('Informe ao menos um código de item.')
-		return parts
+		# Remove repetições preservando a ordem digitada.
+		return list(dict.fromkeys(parts))
@@ -52,6 +52,7 @@ class Command(BaseCommand):
 		force = options['force']
 		created = 0
 		updated = 0
+		existing = CostParameter.objects.count()
 
 		for data in DEFAULT_PARAMETERS:
 			obj, created_flag = CostParameter.objects.get_or_create(
@@ -70,5 +71,5 @@ class Command(BaseCommand):
 			else:
 				self.stdout.write(f'Existente (sem alterações): {obj.label}')
 
-		summary = f'Parâmetros criados: {created}; atualizados: {updated}; total configurado: {CostParameter.objects.count()}'
+		summary = f'Parâmetros criados: {created}; atualizados: {updated}; total configurado: {existing + created}'
 		self.stdout.write(self.style.SUCCESS(summary))
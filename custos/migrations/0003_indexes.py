@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-16 10:43
+
+from django.db import migrations, models
+
+
+def create_code_trgm_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS custos_costbatchitem_code_trgm
+            ON custos_costbatchitem USING gin (code gin_trgm_ops);
+        """)
+
+
+def drop_code_trgm_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS custos_costbatchitem_code_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custos', '0002_costbatch_costbatchitem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='costbatchitem',
+            name='code',
+            field=models.CharField(db_index=True, max_length=100, verbose_name='Código'),
+        ),
+        migrations.AlterField(
+            model_name='costparameter',
+            name='is_active',
+            field=models.BooleanField(db_index=True, default=True, verbose_name='Ativo'),
+        ),
+        migrations.RunPython(create_code_trgm_index, reverse_code=drop_code_trgm_index),
+    ]
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import custos.fields
+from django.db import migrations
+
+PERCENT_FIELDS = {
+    'costbatch': {
+        'default_ipi_percent': ('IPI padrão (%)', Decimal('0')),
+        'default_freight_percent': ('Frete padrão (%)', Decimal('0')),
+        'mva_percent': ('MVA (%)', Decimal('35')),
+        'st_percent': ('Carga tributária ST (%)', Decimal('24')),
+    },
+    'costbatchitem': {
+        'ipi_percent': ('IPI (%)', Decimal('0')),
+        'freight_percent': ('Frete (%)', Decimal('0')),
+    },
+}
+
+
+def _copy(apps, source_suffix, target_suffix):
+    for model_name, fields in PERCENT_FIELDS.items():
+        model = apps.get_model('custos', model_name)
+        objs = list(model.objects.all())
+        for obj in objs:
+            for name in fields:
+                setattr(obj, f'{name}{target_suffix}', getattr(obj, f'{name}{source_suffix}'))
+        model.objects.bulk_update(objs, [f'{name}{target_suffix}' for name in fields], batch_size=500)
+
+
+def copy_to_bps(apps, schema_editor):
+    _copy(apps, '', '_bps')
+
+
+def copy_from_bps(apps, schema_editor):
+    _copy(apps, '_bps', '')
+
+
+def _operations():
+    add, remove, rename = [], [], []
+    for model_name, fields in PERCENT_FIELDS.items():
+        for name, (verbose_name, default) in fields.items():
+            add.append(migrations.AddField(
+                model_name=model_name,
+                name=f'{name}_bps',
+                field=custos.fields.PercentBpsField(default=default, verbose_name=verbose_name),
+            ))
+            remove.append(migrations.RemoveField(model_name=model_name, name=name))
+            rename.append(migrations.RenameField(model_name=model_name, old_name=f'{name}_bps', new_name=name))
+    return [*add, migrations.RunPython(copy_to_bps, reverse_code=copy_from_bps), *remove, *rename]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custos', '0003_indexes'),
+    ]
+
+    operations = _operations()
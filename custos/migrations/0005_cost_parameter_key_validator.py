@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-16 11:49
+
+import django.core.validators
+import re
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custos', '0004_percent_bps_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='costparameter',
+            name='key',
+            field=models.CharField(help_text='Usado em integrações e referências internas (somente letras, números, hífen e sublinhado).', max_length=80, unique=True, validators=[django.core.validators.RegexValidator(re.compile('^[A-Za-z0-9_\\-]+\\Z'), 'Use somente letras, números, hífen ou sublinhado.', 'invalid')], verbose_name='Identificador'),
+        ),
+    ]
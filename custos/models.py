@@ -1,20 +1,125 @@
-from decimal import Decimal, ROUND_HALF_UP
+import re
+import time
+from decimal import Decimal
+from functools import lru_cache
 
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.core.validators import RegexValidator
+from django.db import models, transaction
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .fields import PercentBpsField
+
+# Instâncias compartilhadas (Decimal é imutável) usadas como padrão dos campos.
+_D0 = Decimal('0')
+_D1 = Decimal('1')
+_D24 = Decimal('24')
+_D35 = Decimal('35')
+_D135 = Decimal('1.35')
+_ZERO = Decimal('0.00')
+
+# Identificador de parâmetro: letras, números, hífen e sublinhado (os parâmetros
+# semeados usam "_"). O mesmo padrão valida o modelo, o formulário e o atributo
+# pattern do HTML; o hífen vai escapado porque os navegadores compilam o pattern
+# com a flag "v", que rejeita "-" solto no fim da classe.
+COST_PARAMETER_KEY_PATTERN = r'[A-Za-z0-9_\-]+'
+validate_cost_parameter_key = RegexValidator(
+	re.compile(rf'^{COST_PARAMETER_KEY_PATTERN}\Z'),
+	'Use somente letras, números, hífen ou sublinhado.',
+	'invalid',
+)
+
+
+def _round_half_up(numerator: int, denominator: int) -> int:
+	"""Divide inteiros arredondando metades para longe do zero (ROUND_HALF_UP)."""
+	if (numerator < 0) != (denominator < 0):
+		return -((2 * abs(numerator) + abs(denominator)) // (2 * abs(denominator)))
+	return (2 * abs(numerator) + abs(denominator)) // (2 * abs(denominator))
+
+
+def _cents_to_decimal(cents: int) -> Decimal:
+	if not cents:
+		return _ZERO
+	return Decimal(cents).scaleb(-2)
+
+
+def _pct_component_cents(price_n: int, price_d: int, percent) -> int:
+	"""Centavos de ``percent``% sobre o preço ``price_n / price_d``."""
+	# Percentuais zerados são o caso comum (padrões do lote).
+	if not percent:
+		return 0
+	pct_n, pct_d = percent.as_integer_ratio()
+	return _round_half_up(price_n * pct_n, price_d * pct_d)
+
+
+@lru_cache(maxsize=4096)
+def compute_cost_components(unit_price, ipi_percent, freight_percent, st_multiplier, st_percent):
+	"""Calcula (IPI, frete, ST, custo de reposição) em R$, arredondados em centavos.
+
+	Itens de uma mesma tabela de fornecedor repetem muito as combinações de
+	preço e percentuais, por isso o resultado fica em cache (Decimals são
+	imutáveis e hasheáveis).
+	"""
+	price = unit_price or _D0
+	if not price:
+		return _ZERO, _ZERO, _ZERO, _ZERO
+	# Aritmética inteira em centavos sobre as frações exatas dos Decimals:
+	# mesmo resultado do quantize(0.01, ROUND_HALF_UP), sem os Decimals
+	# intermediários.
+	price_n, price_d = price.as_integer_ratio()
+	ipi_cents = _pct_component_cents(price_n, price_d, ipi_percent)
+	freight_cents = _pct_component_cents(price_n, price_d, freight_percent)
+	# base_total = preço + IPI + frete, representado como base_n / (price_d * 100)
+	base_n = price_n * 100 + (ipi_cents + freight_cents) * price_d
+	mult_n, mult_d = (st_multiplier or _D0).as_integer_ratio()
+	st_pct_n, st_pct_d = (st_percent or _D0).as_integer_ratio()
+	st_cents = _round_half_up(base_n * mult_n * st_pct_n, price_d * 100 * mult_d * st_pct_d)
+	replacement_cents = _round_half_up(base_n + st_cents * price_d, price_d)
+	return (
+		_cents_to_decimal(ipi_cents),
+		_cents_to_decimal(freight_cents),
+		_cents_to_decimal(st_cents),
+		_cents_to_decimal(replacement_cents),
+	)
+
+
+class CostParameterQuerySet(models.QuerySet):
+	"""Gravações em massa não passam por save()/delete(): invalidam a listagem aqui."""
+
+	def update(self, **kwargs):
+		rows = super().update(**kwargs)
+		self.model.invalidate_list_cache(using=self.db)
+		return rows
+
+	def bulk_create(self, *args, **kwargs):
+		objs = super().bulk_create(*args, **kwargs)
+		self.model.invalidate_list_cache(using=self.db)
+		return objs
+
+	def bulk_update(self, *args, **kwargs):
+		rows = super().bulk_update(*args, **kwargs)
+		self.model.invalidate_list_cache(using=self.db)
+		return rows
+
+	def delete(self):
+		result = super().delete()
+		self.model.invalidate_list_cache(using=self.db)
+		return result
 
 
 class CostParameter(models.Model):
-	key = models.SlugField('Identificador', max_length=80, unique=True,
-		help_text='Usado em integrações e referências internas (somente letras, números e hífen).')
+	key = models.CharField('Identificador', max_length=80, unique=True,
+		validators=[validate_cost_parameter_key],
+		help_text='Usado em integrações e referências internas (somente letras, números, hífen e sublinhado).')
 	label = models.CharField('Nome', max_length=160)
-	value = models.DecimalField('Valor', max_digits=12, decimal_places=4, default=Decimal('0'))
+	value = models.DecimalField('Valor', max_digits=12, decimal_places=4, default=_D0)
 	unit = models.CharField('Unidade', max_length=32, blank=True,
 		help_text='Ex.: %, R$, unidade etc.')
 	is_percentage = models.BooleanField('É percentual?', default=False)
 	description = models.TextField('Descrição', blank=True)
-	is_active = models.BooleanField('Ativo', default=True)
+	is_active = models.BooleanField('Ativo', default=True, db_index=True)
 	created_at = models.DateTimeField('Criado em', auto_now_add=True)
 	updated_at = models.DateTimeField('Atualizado em', auto_now=True)
 	updated_by = models.ForeignKey(
@@ -25,6 +130,13 @@ class CostParameter(models.Model):
 		related_name='cost_parameters_updates',
 	)
 
+	objects = CostParameterQuerySet.as_manager()
+
+	# Versão da listagem em cache; muda a cada gravação/exclusão de parâmetro.
+	# Fica no cache padrão, que é local ao processo: outros workers só enxergam a
+	# alteração quando a página em cache expira (PARAMETER_LIST_CACHE_TIMEOUT).
+	LIST_CACHE_VERSION_KEY = 'custos.parameters.version'
+
 	class Meta:
 		verbose_name = 'Parâmetro de custo'
 		verbose_name_plural = 'Parâmetros de custo'
@@ -33,6 +145,7 @@ class CostParameter(models.Model):
 	def __str__(self):
 		return f'{self.label} ({self.key})'
 
+	@cached_property
 	def formatted_value(self):
 		if self.is_percentage:
 			return f'{self.value:.2f}%'
@@ -44,16 +157,43 @@ class CostParameter(models.Model):
 		if self.key:
 			self.key = self.key.strip().lower()
 		super().save(*args, **kwargs)
+		self.__dict__.pop('formatted_value', None)
+		self.invalidate_list_cache(using=kwargs.get('using'))
+
+	def delete(self, *args, **kwargs):
+		result = super().delete(*args, **kwargs)
+		self.invalidate_list_cache(using=kwargs.get('using'))
+		return result
+
+	@classmethod
+	def list_cache_version(cls):
+		version = cache.get(cls.LIST_CACHE_VERSION_KEY)
+		if version is None:
+			version = cls.bump_list_cache_version()
+		return version
+
+	@classmethod
+	def bump_list_cache_version(cls):
+		# Relógio em vez de incr(): se a chave expirar, não reaproveita versões antigas.
+		version = time.time_ns()
+		cache.set(cls.LIST_CACHE_VERSION_KEY, version, None)
+		return version
+
+	@classmethod
+	def invalidate_list_cache(cls, using=None):
+		# Só depois do commit: antes dele uma listagem concorrente ainda lê as
+		# linhas antigas e as gravaria no cache sob a versão nova.
+		transaction.on_commit(cls.bump_list_cache_version, using=using)
 
 
 class CostBatch(models.Model):
 	name = models.CharField('Nome do lote', max_length=120)
 	description = models.TextField('Descrição', blank=True)
-	default_ipi_percent = models.DecimalField('IPI padrão (%)', max_digits=6, decimal_places=2, default=Decimal('0'))
-	default_freight_percent = models.DecimalField('Frete padrão (%)', max_digits=6, decimal_places=2, default=Decimal('0'))
-	mva_percent = models.DecimalField('MVA (%)', max_digits=6, decimal_places=2, default=Decimal('35'))
-	st_percent = models.DecimalField('Carga tributária ST (%)', max_digits=6, decimal_places=2, default=Decimal('24'))
-	st_multiplier = models.DecimalField('Multiplicador ST', max_digits=8, decimal_places=4, default=Decimal('1.35'))
+	default_ipi_percent = PercentBpsField('IPI padrão (%)', default=_D0)
+	default_freight_percent = PercentBpsField('Frete padrão (%)', default=_D0)
+	mva_percent = PercentBpsField('MVA (%)', default=_D35)
+	st_percent = PercentBpsField('Carga tributária ST (%)', default=_D24)
+	st_multiplier = models.DecimalField('Multiplicador ST', max_digits=8, decimal_places=4, default=_D135)
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 	created_by = models.ForeignKey(
@@ -73,20 +213,13 @@ class CostBatch(models.Model):
 		return self.name
 
 	def compute_components(self, *, unit_price: Decimal, ipi_percent: Decimal, freight_percent: Decimal):
-		price = unit_price or Decimal('0')
-		ipi_percent = ipi_percent or Decimal('0')
-		freight_percent = freight_percent or Decimal('0')
-
-		def _percent_value(value):
-			if value in (None, ''):
-				return Decimal('0')
-			return (price * value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-		ipi_value = _percent_value(ipi_percent)
-		freight_value = _percent_value(freight_percent)
-		base_total = price + ipi_value + freight_value
-		st_value = (base_total * self.st_multiplier * (self.st_percent / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-		replacement_cost = (base_total + st_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+		ipi_value, freight_value, st_value, replacement_cost = compute_cost_components(
+			unit_price,
+			ipi_percent,
+			freight_percent,
+			self.st_multiplier,
+			self.st_percent,
+		)
 		return {
 			'ipi_value': ipi_value,
 			'freight_value': freight_value,
@@ -104,18 +237,18 @@ class CostBatchItem(models.Model):
 		blank=True,
 		related_name='cost_batch_items',
 	)
-	code = models.CharField('Código', max_length=100)
+	code = models.CharField('Código', max_length=100, db_index=True)
 	description = models.CharField('Descrição', max_length=255, blank=True)
 	unit = models.CharField('Unidade', max_length=50, blank=True)
-	quantity = models.DecimalField('Quantidade', max_digits=10, decimal_places=3, default=Decimal('1'))
+	quantity = models.DecimalField('Quantidade', max_digits=10, decimal_places=3, default=_D1)
 	pack_quantity = models.DecimalField('Qtd. por embal.', max_digits=10, decimal_places=3, blank=True, null=True)
-	unit_price = models.DecimalField('Preço de compra', max_digits=14, decimal_places=4, default=Decimal('0'))
-	ipi_percent = models.DecimalField('IPI (%)', max_digits=6, decimal_places=2, default=Decimal('0'))
-	freight_percent = models.DecimalField('Frete (%)', max_digits=6, decimal_places=2, default=Decimal('0'))
-	ipi_value = models.DecimalField('IPI (R$)', max_digits=14, decimal_places=4, default=Decimal('0'))
-	freight_value = models.DecimalField('Frete (R$)', max_digits=14, decimal_places=4, default=Decimal('0'))
-	st_value = models.DecimalField('ST (R$)', max_digits=14, decimal_places=4, default=Decimal('0'))
-	replacement_cost = models.DecimalField('Custo reposição', max_digits=14, decimal_places=4, default=Decimal('0'))
+	unit_price = models.DecimalField('Preço de compra', max_digits=14, decimal_places=4, default=_D0)
+	ipi_percent = PercentBpsField('IPI (%)', default=_D0)
+	freight_percent = PercentBpsField('Frete (%)', default=_D0)
+	ipi_value = models.DecimalField('IPI (R$)', max_digits=14, decimal_places=4, default=_D0)
+	freight_value = models.DecimalField('Frete (R$)', max_digits=14, decimal_places=4, default=_D0)
+	st_value = models.DecimalField('ST (R$)', max_digits=14, decimal_places=4, default=_D0)
+	replacement_cost = models.DecimalField('Custo reposição', max_digits=14, decimal_places=4, default=_D0)
 	updated_at = models.DateTimeField(auto_now=True)
 
 	class Meta:
@@ -134,14 +267,37 @@ class CostBatchItem(models.Model):
 			self.unit = self.supplier_item.unit or self.unit
 			self.quantity = self.supplier_item.quantity or self.quantity
 			self.pack_quantity = self.supplier_item.pack_quantity
-			if self.supplier_item.unit_price not in (None, ''):
+			# DecimalField nunca devolve '', basta checar None.
+			if self.supplier_item.unit_price is not None:
 				self.unit_price = self.supplier_item.unit_price
 
-	def recompute_totals(self):
-		ipi_percent = self.ipi_percent if self.ipi_percent is not None else self.batch.default_ipi_percent
-		freight_percent = self.freight_percent if self.freight_percent is not None else self.batch.default_freight_percent
-		components = self.batch.compute_components(
-			unit_price=self.unit_price or Decimal('0'),
+	@classmethod
+	def sync_many(cls, items):
+		"""Executa ``sync_from_supplier`` em vários itens com uma única consulta."""
+		items = list(items)
+		pending_ids = {
+			item.supplier_item_id
+			for item in items
+			if item.supplier_item_id and not cls.supplier_item.is_cached(item)
+		}
+		if pending_ids:
+			supplier_model = cls._meta.get_field('supplier_item').related_model
+			supplier_items = supplier_model.objects.in_bulk(pending_ids)
+			for item in items:
+				if item.supplier_item_id in pending_ids:
+					item.supplier_item = supplier_items.get(item.supplier_item_id)
+		for item in items:
+			item.sync_from_supplier()
+		return items
+
+	def recompute_totals(self, batch=None):
+		# Quem processa vários itens do mesmo lote pode informar o lote já
+		# carregado, evitando a busca da FK em cada item.
+		batch = batch or self.batch
+		ipi_percent = self.ipi_percent if self.ipi_percent is not None else batch.default_ipi_percent
+		freight_percent = self.freight_percent if self.freight_percent is not None else batch.default_freight_percent
+		components = batch.compute_components(
+			unit_price=self.unit_price or _D0,
 			ipi_percent=ipi_percent,
 			freight_percent=freight_percent,
 		)
@@ -150,8 +306,33 @@ class CostBatchItem(models.Model):
 		self.st_value = components['st_value']
 		self.replacement_cost = components['replacement_cost']
 
-	def save(self, *args, **kwargs):
-		self.recompute_totals()
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		instance._loaded_values = dict(zip(field_names, values))
+		return instance
+
+	def _changed_fields(self):
+		loaded = getattr(self, '_loaded_values', None)
+		if loaded is None or self.pk is None or self.get_deferred_fields():
+			return None
+		return [
+			name for name, value in loaded.items()
+			if name not in ('id', 'updated_at') and getattr(self, name) != value
+		]
+
+	def save(self, *args, skip_recompute=False, **kwargs):
+		if not skip_recompute:
+			self.recompute_totals()
+		if not args and not kwargs:
+			# Itens carregados do banco só gravam as colunas alteradas; sem
+			# alterações, o UPDATE é dispensado.
+			changed = self._changed_fields()
+			if changed is not None:
+				if not changed:
+					return
+				kwargs['update_fields'] = [*changed, 'updated_at']
 		super().save(*args, **kwargs)
+		self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
 # Create your models here.
@@ -1,7 +1,13 @@
-from decimal import Decimal
+import warnings
+from decimal import Decimal, ROUND_HALF_UP
 from datetime import date, timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.cache import CacheKeyWarning
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -9,8 +15,17 @@ from django.utils import timezone
 from companies.models import Company
 from core.middleware import ActiveCompanyMiddleware
 from products.models import Product, Supplier, SupplierProductPrice
-from .models import CostBatch, CostBatchItem
-from .views import _calc_components
+from .forms import CostBatchAddItemsForm, CostParameterForm
+from .models import CostBatch, CostBatchItem, CostParameter, compute_cost_components
+from .views import (
+	_add_supplier_items_to_batch,
+	_calc_components,
+	_catalog_search_filter,
+	_format_cursor,
+	_keyset_page,
+	_latest_supplier_items,
+	_parse_cursor,
+)
 
 
 class BatchSelectItemsViewTests(TestCase):
@@ -60,8 +75,178 @@ class BatchSelectItemsViewTests(TestCase):
 		self.assertEqual(items[0].code, 'FOO123')
 		self.assertEqual(response.context['total'], 1)
 
+	def test_catalog_search_filter_requires_every_term(self):
+		qs = SupplierProductPrice.objects.all()
+		matches = qs.filter(_catalog_search_filter('foo  FOO%produto'))
+		self.assertEqual([item.code for item in matches], ['FOO123'])
+		self.assertFalse(qs.filter(_catalog_search_filter('foo bar')).exists())
+
+	def test_keyset_page_walks_catalog_by_cursor(self):
+		SupplierProductPrice.objects.create(
+			supplier=self.supplier,
+			code='BAR999',
+			description='Item Bar repetido',
+			unit_price=Decimal('16.00'),
+			valid_from=date(2024, 2, 1),
+		)
+		qs = SupplierProductPrice.objects.all()
+
+		first, has_previous, has_next = _keyset_page(qs, per_page=2)
+		self.assertEqual([item.code for item in first], ['BAR999', 'BAR999'])
+		self.assertFalse(has_previous)
+		self.assertTrue(has_next)
+
+		cursor = _parse_cursor(_format_cursor(first[-1]))
+		second, has_previous, has_next = _keyset_page(qs, after=cursor, per_page=2)
+		self.assertEqual([item.code for item in second], ['FOO123'])
+		self.assertTrue(has_previous)
+		self.assertFalse(has_next)
+
+		cursor = _parse_cursor(_format_cursor(second[0]))
+		back, has_previous, has_next = _keyset_page(qs, before=cursor, per_page=2)
+		self.assertEqual([item.pk for item in back], [item.pk for item in first])
+		self.assertFalse(has_previous)
+		self.assertTrue(has_next)
+
+
+class CostParameterFormTests(TestCase):
+	def _form(self, key):
+		return CostParameterForm(data={
+			'label': 'Teste',
+			'key': key,
+			'value': '1',
+			'is_active': True,
+		})
+
+	def test_accepts_slug_keys(self):
+		self.assertTrue(self._form('despesa_fixa-percent').is_valid())
+
+	def test_rejects_invalid_characters(self):
+		form = self._form('chave inválida')
+		self.assertFalse(form.is_valid())
+		self.assertIn('key', form.errors)
+
+	def test_uppercase_key_is_normalized_and_checked_for_uniqueness(self):
+		form = self._form('Despesa_Fixa')
+		self.assertTrue(form.is_valid())
+		self.assertEqual(form.cleaned_data['key'], 'despesa_fixa')
+		form.save()
+		self.assertFalse(self._form('DESPESA_FIXA').is_valid())
+
+	def test_model_uses_the_same_key_validator(self):
+		parameter = CostParameter(key='chave inválida', label='Teste')
+		with self.assertRaises(ValidationError) as ctx:
+			parameter.full_clean()
+		self.assertIn('key', ctx.exception.message_dict)
+
+
+class CostParameterListCacheTests(TestCase):
+	def test_save_and_delete_change_list_cache_version(self):
+		initial = CostParameter.list_cache_version()
+		self.assertEqual(CostParameter.list_cache_version(), initial)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			parameter = CostParameter.objects.create(key='frete', label='Frete')
+		after_save = CostParameter.list_cache_version()
+		self.assertNotEqual(after_save, initial)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			parameter.delete()
+		self.assertNotEqual(CostParameter.list_cache_version(), after_save)
+
+	def test_bulk_writes_change_list_cache_version(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			CostParameter.objects.create(key='frete', label='Frete')
+		before = CostParameter.list_cache_version()
+		with self.captureOnCommitCallbacks(execute=True):
+			CostParameter.objects.filter(key='frete').update(label='Frete CIF')
+		after_update = CostParameter.list_cache_version()
+		self.assertNotEqual(after_update, before)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			CostParameter.objects.filter(key='frete').delete()
+		self.assertNotEqual(CostParameter.list_cache_version(), after_update)
+
+	def test_list_cache_version_changes_only_after_commit(self):
+		before = CostParameter.list_cache_version()
+		with self.captureOnCommitCallbacks() as callbacks:
+			CostParameter.objects.create(key='frete', label='Frete')
+			self.assertEqual(CostParameter.list_cache_version(), before)
+		self.assertEqual(len(callbacks), 1)
+		self.assertEqual(CostParameter.list_cache_version(), before)
+		callbacks[0]()
+		self.assertNotEqual(CostParameter.list_cache_version(), before)
+
+	def test_parameter_list_accepts_free_text_query(self):
+		user = get_user_model().objects.create_user('custos', password='pw123456')
+		self.client.force_login(user)
+		CostParameter.objects.create(key='frete', label='Frete')
+		query = 'frete ' + '\t' * 3 + 'x' * 300
+		# Só a chave de cache importa aqui, não o template.
+		with mock.patch('custos.views.render', return_value=HttpResponse()), warnings.catch_warnings():
+			warnings.simplefilter('error', CacheKeyWarning)
+			for _ in range(2):
+				response = self.client.get(reverse('custos:parameter_list'), {'q': query})
+				self.assertEqual(response.status_code, 200)
+
+
+class CostBatchAddItemsFormTests(TestCase):
+	def test_codes_are_split_and_deduplicated(self):
+		form = CostBatchAddItemsForm(data={'codes': 'B2; A1\nB2,,C3\r\nA1'})
+		self.assertTrue(form.is_valid())
+		self.assertEqual(form.cleaned_data['codes'], ['B2', 'A1', 'C3'])
+
+
+class CostBatchComputeComponentsTests(TestCase):
+	def test_rounds_half_up_to_cents(self):
+		batch = CostBatch(st_multiplier=Decimal('1.35'), st_percent=Decimal('24.00'))
+		components = batch.compute_components(
+			unit_price=Decimal('12.0050'),
+			ipi_percent=Decimal('4.50'),
+			freight_percent=Decimal('0'),
+		)
+		self.assertEqual(components['ipi_value'], Decimal('0.54'))
+		self.assertEqual(components['freight_value'], Decimal('0.00'))
+		self.assertEqual(components['st_value'], Decimal('4.06'))
+		self.assertEqual(components['replacement_cost'], Decimal('16.61'))
+
+	def test_integer_cents_match_decimal_reference(self):
+		cent = Decimal('0.01')
+
+		def reference(price, ipi_percent, freight_percent):
+			ipi = (price * ipi_percent / 100).quantize(cent, ROUND_HALF_UP)
+			freight = (price * freight_percent / 100).quantize(cent, ROUND_HALF_UP)
+			base = price + ipi + freight
+			st = (base * Decimal('1.35') * Decimal('24') / 100).quantize(cent, ROUND_HALF_UP)
+			return ipi, freight, st, (base + st).quantize(cent, ROUND_HALF_UP)
+
+		prices = [Decimal(f'{n}.{n * 37 % 10000:04d}') for n in range(0, 400, 7)]
+		percents = [Decimal('0'), Decimal('0.01'), Decimal('4.50'), Decimal('12.75'), Decimal('99.99')]
+		for price in prices:
+			for ipi_percent in percents:
+				for freight_percent in percents:
+					self.assertEqual(
+						compute_cost_components(price, ipi_percent, freight_percent, Decimal('1.35'), Decimal('24')),
+						reference(price, ipi_percent, freight_percent),
+						msg=f'{price} {ipi_percent} {freight_percent}',
+					)
+
+
+class PercentBpsFieldTests(TestCase):
+	def test_round_trips_two_decimal_places(self):
+		batch = CostBatch.objects.create(name='Lote bps', default_ipi_percent=Decimal('4.5'), st_percent=Decimal('9999.99'))
+		batch.refresh_from_db()
+		self.assertEqual(str(batch.default_ipi_percent), '4.50')
+		self.assertEqual(batch.st_percent, Decimal('9999.99'))
+		self.assertEqual(str(batch.default_freight_percent), '0.00')
+		self.assertTrue(CostBatch.objects.filter(default_ipi_percent=Decimal('4.50')).exists())
+
 
 class PurchaseCostsUpdateTests(TestCase):
+	NEW_UNIT_PRICE = Decimal('12.50')
+	NEW_IPI_PERCENT = Decimal('4.00')
+	NEW_FREIGHT_PERCENT = Decimal('2.50')
+
 	@classmethod
 	def setUpTestData(cls):
 		User = get_user_model()
@@ -112,16 +297,16 @@ class PurchaseCostsUpdateTests(TestCase):
 			'form-MIN_NUM_FORMS': '0',
 			'form-MAX_NUM_FORMS': '1000',
 			'form-0-id': str(self.catalog_item.pk),
-			'form-0-unit_price': '12.50',
-			'form-0-ipi_percent': '4.00',
-			'form-0-freight_percent': '2.50',
+			'form-0-unit_price': str(self.NEW_UNIT_PRICE),
+			'form-0-ipi_percent': str(self.NEW_IPI_PERCENT),
+			'form-0-freight_percent': str(self.NEW_FREIGHT_PERCENT),
 			'update_products': '1',
 		}
 		resp = self.client.post(url, data)
 		self.assertEqual(resp.status_code, 302)
 
 		self.product.refresh_from_db()
-		components = _calc_components(Decimal('12.50'), Decimal('4.00'), Decimal('2.50'))
+		components = _calc_components(self.NEW_UNIT_PRICE, self.NEW_IPI_PERCENT, self.NEW_FREIGHT_PERCENT)
 		self.assertEqual(self.product.cost_price, components['replacement_cost'])
 		self.assertIsNotNone(self.product.cost_price_updated_at)
 		self.assertIsNotNone(self.product.cost_price_company)
@@ -131,8 +316,48 @@ class PurchaseCostsUpdateTests(TestCase):
 			timedelta(seconds=5)
 		)
 
+	def test_product_cost_follows_last_code_when_items_share_product(self):
+		second_item = SupplierProductPrice.objects.create(
+			supplier=self.supplier,
+			product=self.product,
+			code='PT-002',
+			description='Parafuso referência caixa',
+			unit_price=Decimal('20.00'),
+			valid_from=date(2024, 1, 1),
+		)
+		url = reverse('custos:purchase_costs')
+		data = {
+			'form-TOTAL_FORMS': '2',
+			'form-INITIAL_FORMS': '2',
+			'form-MIN_NUM_FORMS': '0',
+			'form-MAX_NUM_FORMS': '1000',
+			'form-0-id': str(self.catalog_item.pk),
+			'form-0-unit_price': str(self.NEW_UNIT_PRICE),
+			'form-0-ipi_percent': str(self.NEW_IPI_PERCENT),
+			'form-0-freight_percent': str(self.NEW_FREIGHT_PERCENT),
+			'form-1-id': str(second_item.pk),
+			'form-1-unit_price': '21.00',
+			'form-1-ipi_percent': '0',
+			'form-1-freight_percent': '0',
+			'update_products': '1',
+		}
+		resp = self.client.post(url, data)
+		self.assertEqual(resp.status_code, 302)
+
+		self.product.refresh_from_db()
+		second_item.refresh_from_db()
+		self.assertEqual(self.product.cost_price, second_item.replacement_cost)
+		self.assertEqual(
+			second_item.replacement_cost,
+			_calc_components(Decimal('21.00'), Decimal('0'), Decimal('0'))['replacement_cost'],
+		)
+
 
 class BatchDetailSaveTests(TestCase):
+	NEW_UNIT_PRICE = Decimal('12.00')
+	NEW_IPI_PERCENT = Decimal('4.50')
+	NEW_FREIGHT_PERCENT = Decimal('1.50')
+
 	@classmethod
 	def setUpTestData(cls):
 		User = get_user_model()
@@ -193,6 +418,111 @@ class BatchDetailSaveTests(TestCase):
 		session[ActiveCompanyMiddleware.session_key] = self.company.pk
 		session.save()
 
+	def test_add_items_by_code_creates_and_updates_items(self):
+		SupplierProductPrice.objects.create(
+			supplier=self.supplier,
+			code='PAR-02',
+			description='Parafuso sextavado',
+			unit_price=Decimal('3.00'),
+			valid_from=date(2024, 1, 1),
+		)
+		url = reverse('custos:batch_detail', args=[self.batch.pk])
+		response = self.client.post(url, {
+			'add-codes': 'ARR-01, PAR-02, INEXISTENTE',
+			'add_items': '1',
+		})
+		self.assertEqual(response.status_code, 302)
+
+		new_item = CostBatchItem.objects.get(batch=self.batch, code='PAR-02')
+		expected = self.batch.compute_components(
+			unit_price=Decimal('3.00'),
+			ipi_percent=self.batch.default_ipi_percent,
+			freight_percent=self.batch.default_freight_percent,
+		)
+		self.assertEqual(new_item.replacement_cost, expected['replacement_cost'])
+		self.assertEqual(CostBatchItem.objects.filter(batch=self.batch).count(), 2)
+
+	def test_add_supplier_items_upserts_existing_item_in_place(self):
+		CostBatchItem.objects.filter(pk=self.batch_item.pk).update(quantity=Decimal('3'))
+		self.catalog_item.unit_price = Decimal('8.00')
+		self.catalog_item.freight_percent = None
+
+		added = _add_supplier_items_to_batch(self.batch, [self.catalog_item])
+
+		self.assertEqual(added, 1)
+		item = CostBatchItem.objects.get(batch=self.batch, code=self.catalog_item.code)
+		self.assertEqual(item.pk, self.batch_item.pk)
+		self.assertEqual(item.quantity, Decimal('3'))
+		self.assertEqual(item.unit_price, Decimal('8.00'))
+		self.assertEqual(item.freight_percent, Decimal('2.00'))
+		expected = self.batch.compute_components(
+			unit_price=Decimal('8.00'),
+			ipi_percent=Decimal('5.00'),
+			freight_percent=Decimal('2.00'),
+		)
+		self.assertEqual(item.replacement_cost, expected['replacement_cost'])
+
+	def test_add_supplier_items_counts_one_item_per_code(self):
+		duplicate = SupplierProductPrice.objects.create(
+			supplier=self.supplier,
+			code=self.catalog_item.code,
+			description='Arruela zincada (caixa)',
+			unit_price=Decimal('7.50'),
+			valid_from=date(2024, 7, 1),
+		)
+
+		added = _add_supplier_items_to_batch(self.batch, [self.catalog_item, duplicate])
+
+		self.assertEqual(added, 1)
+		self.assertEqual(CostBatchItem.objects.filter(batch=self.batch).count(), 1)
+
+	def test_add_lookup_item_accepts_zero_padded_ids(self):
+		url = reverse('custos:batch_detail', args=[self.batch.pk])
+		response = self.client.post(url, {
+			'action': 'add_lookup_item',
+			'supplier_item_ids': f'00{self.catalog_item.pk}, {self.catalog_item.pk}',
+		})
+
+		self.assertEqual(response.status_code, 302)
+		texts = [str(message) for message in get_messages(response.wsgi_request)]
+		self.assertIn('Item adicionado ao lote.', texts)
+		self.assertFalse(any('não encontrados' in text for text in texts))
+
+	def test_latest_supplier_items_resolves_codes_in_one_query(self):
+		for valid_from, valid_until, price in (
+			(date(2024, 1, 1), date(2024, 6, 30), Decimal('3.00')),
+			(date(2024, 7, 1), date(2025, 6, 30), Decimal('3.50')),
+		):
+			SupplierProductPrice.objects.create(
+				supplier=self.supplier,
+				code='PAR-02',
+				description='Parafuso sextavado',
+				unit_price=price,
+				valid_from=valid_from,
+				valid_until=valid_until,
+			)
+		with self.assertNumQueries(1):
+			latest = _latest_supplier_items(['ARR-01', 'PAR-02', 'INEXISTENTE'])
+		self.assertEqual(set(latest), {'ARR-01', 'PAR-02'})
+		self.assertEqual(latest['PAR-02'].unit_price, Decimal('3.50'))
+
+	def test_sync_many_loads_supplier_items_in_one_query(self):
+		items = list(CostBatchItem.objects.filter(batch=self.batch))
+		with self.assertNumQueries(1):
+			CostBatchItem.sync_many(items)
+		self.assertEqual(items[0].description, self.catalog_item.description)
+		self.assertEqual(items[0].unit_price, self.catalog_item.unit_price)
+
+	def test_save_skips_update_when_nothing_changed(self):
+		item = CostBatchItem.objects.select_related('batch').get(pk=self.batch_item.pk)
+		with self.assertNumQueries(0):
+			item.save()
+		item.description = 'Arruela lisa'
+		with self.assertNumQueries(1):
+			item.save()
+		item.refresh_from_db()
+		self.assertEqual(item.description, 'Arruela lisa')
+
 	def test_confirm_updates_supplier_and_product(self):
 		url = reverse('custos:batch_detail', args=[self.batch.pk])
 		data = {
@@ -201,9 +531,9 @@ class BatchDetailSaveTests(TestCase):
 			'items-MIN_NUM_FORMS': '0',
 			'items-MAX_NUM_FORMS': '1000',
 			'items-0-id': str(self.batch_item.pk),
-			'items-0-unit_price': '12.00',
-			'items-0-ipi_percent': '4.50',
-			'items-0-freight_percent': '1.50',
+			'items-0-unit_price': str(self.NEW_UNIT_PRICE),
+			'items-0-ipi_percent': str(self.NEW_IPI_PERCENT),
+			'items-0-freight_percent': str(self.NEW_FREIGHT_PERCENT),
 			'save_items': '1',
 		}
 		response = self.client.post(url, data)
@@ -212,14 +542,14 @@ class BatchDetailSaveTests(TestCase):
 		self.catalog_item.refresh_from_db()
 		self.product.refresh_from_db()
 		expected = self.batch.compute_components(
-			unit_price=Decimal('12.00'),
-			ipi_percent=Decimal('4.50'),
-			freight_percent=Decimal('1.50'),
+			unit_price=self.NEW_UNIT_PRICE,
+			ipi_percent=self.NEW_IPI_PERCENT,
+			freight_percent=self.NEW_FREIGHT_PERCENT,
 		)
 
-		self.assertEqual(self.catalog_item.unit_price, Decimal('12.00'))
-		self.assertEqual(self.catalog_item.ipi_percent, Decimal('4.50'))
-		self.assertEqual(self.catalog_item.freight_percent, Decimal('1.50'))
+		self.assertEqual(self.catalog_item.unit_price, self.NEW_UNIT_PRICE)
+		self.assertEqual(self.catalog_item.ipi_percent, self.NEW_IPI_PERCENT)
+		self.assertEqual(self.catalog_item.freight_percent, self.NEW_FREIGHT_PERCENT)
 		self.assertEqual(self.catalog_item.replacement_cost, expected['replacement_cost'])
 		self.assertEqual(self.catalog_item.st_percent, self.batch.st_percent)
 
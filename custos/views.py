@@ -1,16 +1,20 @@
-from decimal import Decimal, ROUND_HALF_UP
+import hashlib
+import re
+from decimal import Decimal
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage, Paginator
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
 from django.forms import modelformset_factory
-from django.db.models import Q, Sum
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
 
-from products.models import Supplier, SupplierProductPrice
+from products.models import Product, Supplier, SupplierProductPrice
 
 from .forms import (
 	CostBatchAddItemsForm,
@@ -19,7 +23,13 @@ from .forms import (
 	CostParameterForm,
 	SupplierCostForm,
 )
-from .models import CostBatch, CostBatchItem, CostParameter
+from .models import CostBatch, CostBatchItem, CostParameter, compute_cost_components
+
+_D0 = Decimal('0')
+_D1 = Decimal('1')
+
+# Parâmetros mudam pouco; a listagem fica em cache e é invalidada ao gravar.
+PARAMETER_LIST_CACHE_TIMEOUT = 60
 
 
 @login_required
@@ -58,11 +68,32 @@ def parameter_list(request):
 	except Exception:
 		per_page = 50
 
+	# q vem do usuário: entra como hash para a chave ser válida em qualquer backend.
+	cache_key = ':'.join([
+		'custos.parameters',
+		str(CostParameter.list_cache_version()),
+		hashlib.sha1(q.encode('utf-8')).hexdigest(),
+		str(show_only_active),
+		order_field,
+		'asc' if dir_ == 'asc' else 'desc',
+		str(page),
+		str(per_page),
+	])
 	paginator = Paginator(qs, per_page)
-	try:
-		page_obj = paginator.page(page)
-	except EmptyPage:
-		page_obj = paginator.page(paginator.num_pages)
+	cached = cache.get(cache_key)
+	if cached is None:
+		try:
+			page_obj = paginator.page(page)
+		except EmptyPage:
+			page_obj = paginator.page(paginator.num_pages)
+		cache.set(
+			cache_key,
+			(list(page_obj.object_list), paginator.count, page_obj.number),
+			PARAMETER_LIST_CACHE_TIMEOUT,
+		)
+	else:
+		parameters, paginator.count, number = cached
+		page_obj = Page(parameters, number, paginator)
 
 	context = {
 		'parameters': page_obj.object_list,
@@ -140,6 +171,18 @@ def batch_create(request):
 	return render(request, 'custos/batch_form.html', {'form': form})
 
 
+BATCH_ITEM_UPDATE_FIELDS = [
+	'unit_price',
+	'ipi_percent',
+	'freight_percent',
+	'ipi_value',
+	'freight_value',
+	'st_value',
+	'replacement_cost',
+	'updated_at',
+]
+
+
 BatchItemFormSet = modelformset_factory(
 	CostBatchItem,
 	form=CostBatchItemForm,
@@ -148,13 +191,103 @@ BatchItemFormSet = modelformset_factory(
 )
 
 
+BATCH_ITEM_SYNC_FIELDS = [
+	'supplier_item',
+	'description',
+	'unit',
+	'pack_quantity',
+	'unit_price',
+	'ipi_percent',
+	'freight_percent',
+	'ipi_value',
+	'freight_value',
+	'st_value',
+	'replacement_cost',
+	'updated_at',
+]
+
+# Colunas do catálogo lidas ao copiar um item para o lote.
+SUPPLIER_ITEM_COPY_FIELDS = (
+	'id',
+	'code',
+	'description',
+	'unit',
+	'quantity',
+	'pack_quantity',
+	'unit_price',
+	'ipi_percent',
+	'freight_percent',
+)
+
+
+def _latest_supplier_items(codes):
+	"""Retorna ``{código: item}`` com a tabela de preço mais recente de cada código."""
+	qs = (
+		SupplierProductPrice.objects.filter(code__in=codes)
+		.only(*SUPPLIER_ITEM_COPY_FIELDS)
+		.order_by('code', '-valid_until', '-id')
+	)
+	if connection.features.can_distinct_on_fields:
+		# DISTINCT ON devolve uma linha por código direto do banco.
+		return {supplier_item.code: supplier_item for supplier_item in qs.distinct('code')}
+	latest = {}
+	for supplier_item in qs:
+		latest.setdefault(supplier_item.code, supplier_item)
+	return latest
+
+
+def _add_supplier_items_to_batch(batch, supplier_items):
+	"""Inclui ou atualiza no lote os itens de catálogo informados.
+
+	Os itens já existentes no lote são lidos numa única consulta (campos sem
+	valor no catálogo mantêm o valor atual) e tudo é gravado num único upsert
+	por ``(batch, code)``. Retorna a quantidade de itens gravados no lote (um por
+	código; itens de catálogo com o mesmo código contam uma vez).
+	"""
+	supplier_items = list(supplier_items)
+	by_code = {supplier_item.code: supplier_item for supplier_item in supplier_items}
+	existing = {item.code: item for item in CostBatchItem.objects.filter(batch=batch, code__in=by_code)}
+	items = []
+	for code, supplier_item in by_code.items():
+		current = existing.get(code) or CostBatchItem(
+			quantity=supplier_item.quantity or _D1,
+			ipi_percent=batch.default_ipi_percent,
+			freight_percent=batch.default_freight_percent,
+		)
+		item = CostBatchItem(
+			batch=batch,
+			code=code,
+			supplier_item=supplier_item,
+			description=supplier_item.description or current.description,
+			unit=supplier_item.unit or current.unit,
+			quantity=current.quantity,
+			pack_quantity=supplier_item.pack_quantity,
+			unit_price=supplier_item.unit_price if supplier_item.unit_price is not None else current.unit_price,
+			ipi_percent=supplier_item.ipi_percent if supplier_item.ipi_percent is not None else current.ipi_percent,
+			freight_percent=supplier_item.freight_percent if supplier_item.freight_percent is not None else current.freight_percent,
+		)
+		item.recompute_totals(batch=batch)
+		items.append(item)
+	with transaction.atomic():
+		CostBatchItem.objects.bulk_create(
+			items,
+			batch_size=500,
+			update_conflicts=True,
+			unique_fields=['batch', 'code'],
+			update_fields=BATCH_ITEM_SYNC_FIELDS,
+		)
+	return len(by_code)
+
+
 @staff_member_required
 def batch_detail(request, pk):
 	batch = get_object_or_404(CostBatch, pk=pk)
-	items_qs = batch.items.select_related('supplier_item', 'supplier_item__supplier', 'supplier_item__product')
+	# O produto só é gravado (nunca lido) ao salvar, então não entra no JOIN.
+	items_qs = batch.items.select_related('supplier_item', 'supplier_item__supplier')
 	formset = BatchItemFormSet(request.POST or None, queryset=items_qs, prefix='items')
 	add_form = CostBatchAddItemsForm(request.POST or None, prefix='add')
 	preview_mode = False
+	preview_summary = None
 	if request.method == 'POST' and request.POST.get('action') == 'add_lookup_item':
 		supplier_item_id = (request.POST.get('supplier_item_id') or '').strip()
 		raw_multiple_ids = (request.POST.get('supplier_item_ids') or '').strip()
@@ -162,45 +295,23 @@ def batch_detail(request, pk):
 		if raw_multiple_ids:
 			id_list.extend([part.strip() for part in raw_multiple_ids.split(',') if part.strip()])
 		if supplier_item_id:
-			if supplier_item_id not in id_list:
-				id_list.append(supplier_item_id)
+			id_list.append(supplier_item_id)
+		# "007" e "7" são o mesmo item: normaliza antes da busca e da lista de não encontrados.
+		id_list = list(dict.fromkeys(
+			str(int(value)) if value.isascii() and value.isdigit() else value
+			for value in id_list
+		))
 		if not id_list:
 			messages.error(request, 'Selecione um item para adicionar.')
 		else:
-			added = 0
-			not_found = []
-			for supplier_item_id in id_list:
-				supplier_item = SupplierProductPrice.objects.filter(pk=supplier_item_id).first()
-				if not supplier_item:
-					not_found.append(supplier_item_id)
-					continue
-				item, created = CostBatchItem.objects.get_or_create(
-					batch=batch,
-					code=supplier_item.code,
-					defaults={
-						'supplier_item': supplier_item,
-						'description': supplier_item.description or '',
-						'unit': supplier_item.unit or '',
-						'quantity': supplier_item.quantity or Decimal('1'),
-						'pack_quantity': supplier_item.pack_quantity,
-						'unit_price': supplier_item.unit_price or Decimal('0'),
-						'ipi_percent': supplier_item.ipi_percent if supplier_item.ipi_percent is not None else batch.default_ipi_percent,
-						'freight_percent': supplier_item.freight_percent if supplier_item.freight_percent is not None else batch.default_freight_percent,
-					},
-				)
-				if not created:
-					item.supplier_item = supplier_item
-					if supplier_item.unit_price not in (None, ''):
-						item.unit_price = supplier_item.unit_price
-					if supplier_item.ipi_percent not in (None, ''):
-						item.ipi_percent = supplier_item.ipi_percent
-					if supplier_item.freight_percent not in (None, ''):
-						item.freight_percent = supplier_item.freight_percent
-					item.description = supplier_item.description or item.description
-					item.unit = supplier_item.unit or item.unit
-					item.pack_quantity = supplier_item.pack_quantity
-				item.save()
-				added += 1
+			found = {
+				str(supplier_item.pk): supplier_item
+				for supplier_item in SupplierProductPrice.objects.filter(
+					pk__in=[value for value in id_list if value.isascii() and value.isdigit()],
+				).only(*SUPPLIER_ITEM_COPY_FIELDS)
+			}
+			not_found = [value for value in id_list if value not in found]
+			added = _add_supplier_items_to_batch(batch, found.values())
 			if added == 1 and len(id_list) == 1:
 				messages.success(request, 'Item adicionado ao lote.')
 			elif added:
@@ -212,40 +323,9 @@ def batch_detail(request, pk):
 	if request.method == 'POST' and 'add_items' in request.POST:
 		if add_form.is_valid():
 			codes = add_form.cleaned_data['codes']
-			added = 0
-			not_found = []
-			for code in codes:
-				supplier_item = SupplierProductPrice.objects.filter(code=code).order_by('-valid_until', '-id').first()
-				if not supplier_item:
-					not_found.append(code)
-					continue
-				item, created = CostBatchItem.objects.get_or_create(
-					batch=batch,
-					code=supplier_item.code,
-					defaults={
-						'supplier_item': supplier_item,
-						'description': supplier_item.description or '',
-						'unit': supplier_item.unit or '',
-						'quantity': supplier_item.quantity or Decimal('1'),
-						'pack_quantity': supplier_item.pack_quantity,
-						'unit_price': supplier_item.unit_price or Decimal('0'),
-						'ipi_percent': supplier_item.ipi_percent if supplier_item.ipi_percent is not None else batch.default_ipi_percent,
-						'freight_percent': supplier_item.freight_percent if supplier_item.freight_percent is not None else batch.default_freight_percent,
-					},
-				)
-				if not created:
-					item.supplier_item = supplier_item
-					if supplier_item.unit_price not in (None, ''):
-						item.unit_price = supplier_item.unit_price
-					if supplier_item.ipi_percent not in (None, ''):
-						item.ipi_percent = supplier_item.ipi_percent
-					if supplier_item.freight_percent not in (None, ''):
-						item.freight_percent = supplier_item.freight_percent
-					item.description = supplier_item.description or item.description
-					item.unit = supplier_item.unit or item.unit
-					item.pack_quantity = supplier_item.pack_quantity
-				item.save()
-				added += 1
+			latest_by_code = _latest_supplier_items(codes)
+			not_found = [code for code in codes if code not in latest_by_code]
+			added = _add_supplier_items_to_batch(batch, [latest_by_code[code] for code in codes if code in latest_by_code])
 			if added:
 				messages.success(request, f'{added} itens adicionados ao lote.')
 			if not_found:
@@ -255,62 +335,91 @@ def batch_detail(request, pk):
 	if request.method == 'POST' and 'preview_items' in request.POST:
 		if formset.is_valid():
 			preview_mode = True
+			# Totais acumulados no mesmo laço do recálculo.
+			total_unit = _D0
+			total_replacement = _D0
 			for form in formset:
 				if form.cleaned_data.get('DELETE'):
 					continue
 				item = form.save(commit=False)
 				item.batch = batch
-				item.recompute_totals()
+				item.recompute_totals(batch=batch)
+				total_unit += form.cleaned_data.get('unit_price') or _D0
+				total_replacement += item.replacement_cost or _D0
+			preview_summary = {
+				'total_unit': total_unit,
+				'total_replacement': total_replacement,
+			}
 			messages.info(request, 'Cálculos atualizados. Revise e confirme para salvar no cadastro.')
 		else:
 			messages.error(request, 'Corrija os erros para visualizar os cálculos.')
 
 	if request.method == 'POST' and 'save_items' in request.POST:
 		if formset.is_valid():
-			updated = 0
-			deleted = 0
-			supplier_updates = 0
-			product_updates = 0
 			active_company = getattr(request, 'company', None)
 			now = timezone.now()
+			changed_items = []
+			new_items = []
+			deleted_items = []
+			# Os cálculos ficam fora da transação; ela só cobre as gravações.
 			for form in formset:
 				if form.cleaned_data.get('DELETE'):
 					if form.instance.pk:
-						form.instance.delete()
-						deleted += 1
+						deleted_items.append(form.instance)
 					continue
 				if not form.has_changed():
 					continue
 				item = form.save(commit=False)
 				item.batch = batch
-				item.save()
-				updated += 1
+				item.recompute_totals(batch=batch)
+				if item.pk:
+					item.updated_at = now
+					changed_items.append(item)
+				else:
+					new_items.append(item)
+			# Indexados por pk: vários itens podem apontar para o mesmo cadastro.
+			changed_supplier_items = {}
+			changed_products = {}
+			product_fields = ['cost_price', 'cost_price_updated_at']
+			if active_company:
+				product_fields.append('cost_price_company')
+			for item in changed_items:
 				supplier_item = item.supplier_item
-				if supplier_item:
-					supplier_item.unit_price = item.unit_price
-					supplier_item.ipi_percent = item.ipi_percent
-					supplier_item.freight_percent = item.freight_percent
-					supplier_item.replacement_cost = item.replacement_cost
-					supplier_item.st_percent = batch.st_percent
-					supplier_item.save(update_fields=[
-						'unit_price',
-						'ipi_percent',
-						'freight_percent',
-						'replacement_cost',
-						'st_percent',
-						'updated_at',
-					])
-					supplier_updates += 1
-					product = supplier_item.product
-					if product:
-						product.cost_price = item.replacement_cost
-						product.cost_price_updated_at = now
-						update_fields = ['cost_price', 'cost_price_updated_at']
-						if active_company:
-							product.cost_price_company = active_company
-							update_fields.append('cost_price_company')
-						product.save(update_fields=update_fields)
-						product_updates += 1
+				if not supplier_item:
+					continue
+				supplier_item.unit_price = item.unit_price
+				supplier_item.ipi_percent = item.ipi_percent
+				supplier_item.freight_percent = item.freight_percent
+				supplier_item.replacement_cost = item.replacement_cost
+				supplier_item.st_percent = batch.st_percent
+				supplier_item.updated_at = now
+				changed_supplier_items[supplier_item.pk] = supplier_item
+				if supplier_item.product_id:
+					product = Product(pk=supplier_item.product_id)
+					product.cost_price = item.replacement_cost
+					product.cost_price_updated_at = now
+					if active_company:
+						product.cost_price_company = active_company
+					changed_products[product.pk] = product
+			supplier_updates = len(changed_supplier_items)
+			product_updates = len(changed_products)
+			deleted = len(deleted_items)
+			updated = len(new_items) + len(changed_items)
+			with transaction.atomic():
+				if deleted_items:
+					CostBatchItem.objects.filter(pk__in=[item.pk for item in deleted_items]).delete()
+				for item in new_items:
+					item.save(skip_recompute=True)
+				CostBatchItem.objects.bulk_update(changed_items, BATCH_ITEM_UPDATE_FIELDS, batch_size=500)
+				SupplierProductPrice.objects.bulk_update(changed_supplier_items.values(), [
+					'unit_price',
+					'ipi_percent',
+					'freight_percent',
+					'replacement_cost',
+					'st_percent',
+					'updated_at',
+				], batch_size=500)
+				Product.objects.bulk_update(changed_products.values(), product_fields, batch_size=500)
 			if updated or deleted:
 				parts = []
 				if updated:
@@ -343,39 +452,97 @@ def batch_detail(request, pk):
 			'item': item,
 		})
 
-	summary = items_qs.aggregate(
-		total_unit=Sum('unit_price'),
-		total_replacement=Sum('replacement_cost'),
-	)
-	if preview_mode and formset.is_valid():
-		total_unit = Decimal('0')
-		total_replacement = Decimal('0')
-		for row in rows:
-			if row['form'].cleaned_data.get('DELETE'):
-				continue
-			total_unit += row['form'].cleaned_data.get('unit_price') or Decimal('0')
-			total_replacement += row['item'].replacement_cost or Decimal('0')
-		summary = {
-			'total_unit': total_unit,
-			'total_replacement': total_replacement,
-		}
+	if preview_summary is None:
+		summary = items_qs.aggregate(
+			total_unit=Sum('unit_price'),
+			total_replacement=Sum('replacement_cost'),
+			total_items=Count('id'),
+		)
+		total_items = summary['total_items']
+	else:
+		summary = preview_summary
+		total_items = items_qs.count()
 
 	context = {
 		'batch': batch,
 		'formset': formset,
 		'add_form': add_form,
 		'rows': rows,
-		'total_items': items_qs.count(),
+		'total_items': total_items,
 		'summary': summary,
 		'preview_mode': preview_mode,
 	}
 	return render(request, 'custos/batch_detail.html', context)
 
 
+_SEARCH_SPLIT_RE = re.compile(r'[%\s]+')
+_CATALOG_SEARCH_FIELDS = ('code', 'description', 'product__name')
+
+
+def _catalog_search_filter(q):
+	"""Um único ``Q`` em que cada termo de ``q`` aparece em algum dos campos do catálogo."""
+	condition = Q()
+	# Termos repetidos (inclusive com outra caixa) não acrescentam nada ao filtro.
+	parts = {p.lower(): p for p in _SEARCH_SPLIT_RE.split(q) if p}
+	for part in parts.values():
+		term = Q()
+		for field in _CATALOG_SEARCH_FIELDS:
+			term |= Q(**{f'{field}__icontains': part})
+		condition &= term
+	return condition
+
+
+def _parse_cursor(raw):
+	"""Converte o cursor ``<id>:<código>`` da querystring em ``(código, id)``."""
+	if not raw:
+		return None
+	item_id, sep, code = raw.partition(':')
+	if not sep or not item_id.isdigit():
+		return None
+	return code, int(item_id)
+
+
+def _format_cursor(item):
+	return f'{item.pk}:{item.code}'
+
+
+def _keyset_page(qs, *, after=None, before=None, per_page):
+	"""Página por cursor (código, id) em vez de OFFSET.
+
+	O catálogo de fornecedores passa de centenas de milhares de linhas; com
+	OFFSET o banco percorre e descarta todas as linhas anteriores à página.
+	Aqui a busca parte direto do último item exibido, usando o índice de
+	``code``. Retorna ``(itens, has_previous, has_next)``.
+	"""
+	if before is not None:
+		code, item_id = before
+		qs = qs.filter(Q(code__lt=code) | Q(code=code, id__lt=item_id)).order_by('-code', '-id')
+		rows = list(qs[:per_page + 1])
+		has_previous = len(rows) > per_page
+		return rows[:per_page][::-1], has_previous, True
+	if after is not None:
+		code, item_id = after
+		qs = qs.filter(Q(code__gt=code) | Q(code=code, id__gt=item_id))
+	rows = list(qs.order_by('code', 'id')[:per_page + 1])
+	return rows[:per_page], after is not None, len(rows) > per_page
+
+
 @staff_member_required
 def batch_select_items(request, pk):
 	batch = get_object_or_404(CostBatch, pk=pk)
-	qs = SupplierProductPrice.objects.select_related('supplier', 'product')
+	# A listagem só exibe estas colunas; evita trazer o restante do catálogo e do produto.
+	qs = SupplierProductPrice.objects.select_related('supplier', 'product').only(
+		'id',
+		'code',
+		'description',
+		'unit_price',
+		'ipi_percent',
+		'freight_percent',
+		'supplier',
+		'supplier__name',
+		'product',
+		'product__name',
+	)
 	q = (request.GET.get('q') or '').strip()
 	supplier_id = request.GET.get('supplier')
 	per_page_raw = request.GET.get('per_page')
@@ -384,81 +551,53 @@ def batch_select_items(request, pk):
 	except Exception:
 		per_page = 50
 	if q:
-		parts = [p for p in q.replace('%', ' ').split() if p]
-		for part in parts:
-			qs = qs.filter(
-				Q(code__icontains=part)
-				| Q(description__icontains=part)
-				| Q(product__name__icontains=part)
-			)
+		qs = qs.filter(_catalog_search_filter(q))
 	if supplier_id:
 		try:
 			supplier_id_int = int(supplier_id)
 			qs = qs.filter(supplier_id=supplier_id_int)
 		except Exception:
 			supplier_id = ''
-	qs = qs.order_by('code')
-	paginator = Paginator(qs, per_page)
-	page_number = request.GET.get('page') or 1
-	try:
-		page_obj = paginator.page(page_number)
-	except EmptyPage:
-		page_obj = paginator.page(paginator.num_pages)
-	items = page_obj.object_list
-
 	if request.method == 'POST':
 		selected_ids = request.POST.getlist('item_ids')
 		if not selected_ids:
 			messages.warning(request, 'Selecione ao menos um item para adicionar ao lote.')
 		else:
-			items_to_add = SupplierProductPrice.objects.filter(id__in=selected_ids)
-			added = 0
-			for supplier_item in items_to_add:
-				item, created = CostBatchItem.objects.get_or_create(
-					batch=batch,
-					code=supplier_item.code,
-					defaults={
-						'supplier_item': supplier_item,
-						'description': supplier_item.description or '',
-						'unit': supplier_item.unit or '',
-						'quantity': supplier_item.quantity or Decimal('1'),
-						'pack_quantity': supplier_item.pack_quantity,
-						'unit_price': supplier_item.unit_price or Decimal('0'),
-						'ipi_percent': supplier_item.ipi_percent if supplier_item.ipi_percent is not None else batch.default_ipi_percent,
-						'freight_percent': supplier_item.freight_percent if supplier_item.freight_percent is not None else batch.default_freight_percent,
-					},
-				)
-				if not created:
-					item.supplier_item = supplier_item
-					if supplier_item.unit_price not in (None, ''):
-						item.unit_price = supplier_item.unit_price
-					if supplier_item.ipi_percent not in (None, ''):
-						item.ipi_percent = supplier_item.ipi_percent
-					if supplier_item.freight_percent not in (None, ''):
-						item.freight_percent = supplier_item.freight_percent
-					item.description = supplier_item.description or item.description
-					item.unit = supplier_item.unit or item.unit
-					item.pack_quantity = supplier_item.pack_quantity
-				item.save()
-				added += 1
+			items_to_add = SupplierProductPrice.objects.filter(
+				id__in=[value for value in selected_ids if value.isdigit()],
+			).only(*SUPPLIER_ITEM_COPY_FIELDS)
+			added = _add_supplier_items_to_batch(batch, items_to_add)
 			if added:
 				messages.success(request, f'{added} itens adicionados ao lote.')
 			else:
 				messages.info(request, 'Nenhum item novo foi adicionado.')
 		return redirect('custos:batch_detail', pk=batch.pk)
 
+	total = qs.count()
+	items, has_previous, has_next = _keyset_page(
+		qs,
+		after=_parse_cursor(request.GET.get('after')),
+		before=_parse_cursor(request.GET.get('before')),
+		per_page=per_page,
+	)
+	previous_cursor = _format_cursor(items[0]) if items else ''
+	next_cursor = _format_cursor(items[-1]) if items else ''
+
 	suppliers = Supplier.objects.order_by('name')
 	context = {
 		'batch': batch,
 		'items': items,
-		'page_obj': page_obj,
-		'is_paginated': paginator.num_pages > 1,
+		'has_previous': has_previous,
+		'has_next': has_next,
+		'previous_cursor': previous_cursor,
+		'next_cursor': next_cursor,
+		'is_paginated': has_previous or has_next,
 		'per_page': per_page,
 		'per_page_options': [20, 50, 100, 200],
 		'q': q,
 		'supplier_id': supplier_id,
 		'suppliers': suppliers,
-		'total': paginator.count,
+		'total': total,
 	}
 	return render(request, 'custos/batch_select_items.html', context)
 
@@ -468,17 +607,15 @@ ST_PERCENT = Decimal('24')
 
 
 def _calc_components(base_price: Decimal, ipi_percent: Decimal, freight_percent: Decimal):
-	base = base_price or Decimal('0')
-	ipi_percent = ipi_percent or Decimal('0')
-	freight_percent = freight_percent or Decimal('0')
-	def _component(value):
-		return (base * value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if value else Decimal('0.00')
-
-	ipi_value = _component(ipi_percent)
-	freight_value = _component(freight_percent)
-
-	st_value = ((base + ipi_value + freight_value) * ST_MULTIPLIER * (ST_PERCENT / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-	replacement_cost = (base + ipi_value + freight_value + st_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+	ipi_percent = ipi_percent or _D0
+	freight_percent = freight_percent or _D0
+	ipi_value, freight_value, st_value, replacement_cost = compute_cost_components(
+		base_price or _D0,
+		ipi_percent,
+		freight_percent,
+		ST_MULTIPLIER,
+		ST_PERCENT,
+	)
 	return {
 		'ipi_value': ipi_value,
 		'freight_value': freight_value,
@@ -490,43 +627,34 @@ def _calc_components(base_price: Decimal, ipi_percent: Decimal, freight_percent:
 	}
 
 
-def _extract_decimal(form, field_name, default=Decimal('0')):
-	if form.is_bound:
-		raw = form.data.get(form.add_prefix(field_name))
-		if raw not in (None, ''):
-			try:
-				return Decimal(str(raw).replace(',', '.'))
-			except Exception:
-				pass
+def _instance_decimal(form, field_name, default):
+	value = getattr(form.instance, field_name, None)
+	if value in (None, ''):
+		return default
+	return value if isinstance(value, Decimal) else Decimal(value)
+
+
+def _extract_decimal(form, field_name, default=_D0):
+	# Form sem POST: o initial do ModelForm é cópia da instância, que já traz Decimal.
+	if not form.is_bound:
+		return _instance_decimal(form, field_name, default)
+	raw = form.data.get(form.add_prefix(field_name))
+	if raw not in (None, ''):
+		try:
+			return Decimal(str(raw).replace(',', '.'))
+		except Exception:
+			pass
 	initial = form.initial.get(field_name) if isinstance(form.initial, dict) else None
 	if initial not in (None, ''):
 		try:
 			return Decimal(initial)
 		except Exception:
 			pass
-	instance_value = getattr(form.instance, field_name, None)
-	if instance_value not in (None, ''):
-		return Decimal(instance_value)
-	return default
+	return _instance_decimal(form, field_name, default)
 
 
 def _extract_unit_price(form):
-	if form.is_bound:
-		raw = form.data.get(form.add_prefix('unit_price'))
-		if raw not in (None, ''):
-			try:
-				return Decimal(str(raw).replace(',', '.'))
-			except Exception:
-				pass
-	initial = form.initial.get('unit_price') if isinstance(form.initial, dict) else None
-	if initial not in (None, ''):
-		try:
-			return Decimal(initial)
-		except Exception:
-			pass
-	if form.instance.unit_price not in (None, ''):
-		return form.instance.unit_price
-	return Decimal('0')
+	return _extract_decimal(form, 'unit_price')
 
 
 @staff_member_required
@@ -536,7 +664,21 @@ def purchase_costs(request):
 	supplier_id = request.GET.get('supplier')
 	update_products = bool(request.POST.get('update_products'))
 
-	qs = SupplierProductPrice.objects.select_related('supplier', 'product').all()
+	# Só as colunas exibidas/gravadas pela tela; o fornecedor não é renderizado.
+	qs = SupplierProductPrice.objects.select_related('product').only(
+		'id',
+		'code',
+		'description',
+		'unit',
+		'quantity',
+		'unit_price',
+		'ipi_percent',
+		'freight_percent',
+		'st_percent',
+		'replacement_cost',
+		'product',
+		'product__name',
+	)
 	codes = []
 	if codes_raw:
 		codes = [c.strip() for c in codes_raw.replace(';', ',').split(',') if c.strip()]
@@ -555,6 +697,13 @@ def purchase_costs(request):
 			pass
 
 	qs = qs.order_by('code')
+	try:
+		per_page = max(1, min(200, int(request.GET.get('per_page') or 50)))
+	except Exception:
+		per_page = 50
+	# O formset carrega cada linha em memória; sem paginação a busca vazia traria o catálogo inteiro.
+	paginator = Paginator(qs, per_page)
+	page_obj = paginator.get_page(request.GET.get('page'))
 
 	formset_class = modelformset_factory(
 		SupplierProductPrice,
@@ -563,17 +712,20 @@ def purchase_costs(request):
 	)
 
 	if request.method == 'POST':
-		formset = formset_class(request.POST, queryset=qs)
+		formset = formset_class(request.POST, queryset=page_obj.object_list)
 		if formset.is_valid():
-			updated = 0
 			has_errors = False
+			active_company = getattr(request, 'company', None)
+			now = timezone.now()
+			to_update_items = []
+			product_ids = set()
 			for form in formset:
 				if not form.has_changed():
 					continue
 				item = form.save(commit=False)
-				unit_price = form.cleaned_data.get('unit_price') or Decimal('0')
-				ipi_percent = form.cleaned_data.get('ipi_percent') or Decimal('0')
-				freight_percent = form.cleaned_data.get('freight_percent') or Decimal('0')
+				unit_price = form.cleaned_data.get('unit_price') or _D0
+				ipi_percent = form.cleaned_data.get('ipi_percent') or _D0
+				freight_percent = form.cleaned_data.get('freight_percent') or _D0
 				if unit_price < 0:
 					form.add_error('unit_price', 'Informe um valor não negativo.')
 					has_errors = True
@@ -592,18 +744,30 @@ def purchase_costs(request):
 				item.st_percent = ST_PERCENT  # guardar referência do percentual utilizado
 				components = _calc_components(unit_price, ipi_percent, freight_percent)
 				item.replacement_cost = components['replacement_cost']
-				item.save(update_fields=['unit_price', 'ipi_percent', 'freight_percent', 'st_percent', 'replacement_cost'])
-				if update_products and item.product:
-					product = item.product
-					update_fields = ['cost_price', 'cost_price_updated_at']
-					product.cost_price = item.replacement_cost
-					product.cost_price_updated_at = timezone.now()
-					active_company = getattr(request, 'company', None)
+				to_update_items.append(item)
+				if update_products and item.product_id:
+					product_ids.add(item.product_id)
+			with transaction.atomic():
+				SupplierProductPrice.objects.bulk_update(
+					to_update_items,
+					['unit_price', 'ipi_percent', 'freight_percent', 'st_percent', 'replacement_cost'],
+					batch_size=500,
+				)
+				if product_ids:
+					# O custo já gravado no item é copiado para o produto pelo próprio banco,
+					# num único UPDATE; havendo mais de um item do produto vale o último código.
+					latest_cost = SupplierProductPrice.objects.filter(
+						pk__in=[item.pk for item in to_update_items],
+						product=OuterRef('pk'),
+					).order_by('-code', '-pk').values('replacement_cost')[:1]
+					product_values = {
+						'cost_price': Subquery(latest_cost),
+						'cost_price_updated_at': now,
+					}
 					if active_company:
-						product.cost_price_company = active_company
-						update_fields.append('cost_price_company')
-					product.save(update_fields=update_fields)
-				updated += 1
+						product_values['cost_price_company'] = active_company
+					Product.objects.filter(pk__in=product_ids).update(**product_values)
+			updated = len(to_update_items)
 			if has_errors:
 				messages.error(request, 'Não foi possível atualizar alguns itens. Corrija os campos destacados.')
 			else:
@@ -613,19 +777,18 @@ def purchase_costs(request):
 					messages.info(request, 'Nenhum item foi alterado.')
 				return redirect(f"{reverse('custos:purchase_costs')}?{request.GET.urlencode()}")
 	else:
-		formset = formset_class(queryset=qs)
+		formset = formset_class(queryset=page_obj.object_list)
 
 	rows = []
 	for form in formset.forms:
 		item = form.instance
 		current_price = _extract_unit_price(form)
-		ipi_percent = _extract_decimal(form, 'ipi_percent', default=item.ipi_percent or Decimal('0'))
-		freight_percent = _extract_decimal(form, 'freight_percent', default=item.freight_percent or Decimal('0'))
-		components = _calc_components(current_price, ipi_percent, freight_percent)
+		ipi_percent = _extract_decimal(form, 'ipi_percent', default=item.ipi_percent or _D0)
+		freight_percent = _extract_decimal(form, 'freight_percent', default=item.freight_percent or _D0)
 		rows.append({
 			'form': form,
 			'item': item,
-			'components': components,
+			'components': _calc_components(current_price, ipi_percent, freight_percent),
 			'unit_price': current_price,
 			'ipi_percent': ipi_percent,
 			'freight_percent': freight_percent,
@@ -638,6 +801,10 @@ def purchase_costs(request):
 		'search': search,
 		'supplier_id': supplier_id,
 		'update_products_flag': update_products,
-		'total': qs.count(),
+		'page_obj': page_obj,
+		'is_paginated': paginator.num_pages > 1,
+		'per_page': per_page,
+		'per_page_options': [20, 50, 100, 200],
+		'total': paginator.count,
 	}
 	return render(request, 'custos/purchase_costs.html', context)
@@ -1,23 +1,32 @@
 from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Body, Request
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from starlette.concurrency import run_in_threadpool
-from pydantic import BaseModel, field_validator, ValidationError, ConfigDict
+from pydantic import BaseModel, field_validator, ValidationError, ConfigDict, TypeAdapter
 from typing import List, Optional
+import anyio
+import asyncio
 import asyncpg
+import functools
 import os
 import base64
 import hashlib
+import itertools
+import json
 import secrets
 import hmac
+import time
 import jwt
 import django
 import re
 from decimal import Decimal
 from datetime import datetime, timedelta, timezone as dt_timezone
 from django.utils import timezone as dj_timezone
+from erp_api import clientes as clientes_module
 from erp_api.clientes import router as clientes_router
 import logging
 from pathlib import Path
@@ -28,6 +37,11 @@ try:
 except Exception:
     load_dotenv = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 if load_dotenv:
     load_dotenv(BASE_DIR / ".env")
@@ -39,7 +53,7 @@ from clients.models import Client, ClienteSync
 from products.models import Product, ProdutoSync
 from api.models import PlanoPagamentoCliente, Loja
 from sales.models import Pedido, ItemPedido
-from django.db import transaction, models, connection
+from django.db import IntegrityError, transaction, models, connection
 from django.core.files.uploadedfile import SimpleUploadedFile
 from core.forms import SefazConfigurationForm
 from core.models import SefazConfiguration
@@ -62,6 +76,8 @@ if not any(isinstance(h, logging.FileHandler) for h in logger.handlers):
 app = FastAPI(
     title=os.getenv("APP_NAME", "API Force"),
     servers=[{"url": os.getenv("PUBLIC_API_URL", "")}],
+    # orjson serializa a resposta final em C; sem ele fica o JSONResponse padrão.
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
 )
 bearer_scheme = HTTPBearer(auto_error=False)
 router = APIRouter(prefix="/api")
@@ -205,8 +221,18 @@ AUTH_DB_CONFIG = {
     "port": int(os.getenv("AUTH_POSTGRES_PORT") or os.getenv("POSTGRES_PORT") or os.getenv("PGPORT") or 5432),
 }
 POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
-POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "20"))
 POOL_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "10"))
+READ_POOL_MIN_SIZE = int(os.getenv("DB_READ_POOL_MIN", "4"))
+READ_POOL_MAX_SIZE = int(os.getenv("DB_READ_POOL_MAX", "32"))
+READ_POOL_COMMAND_TIMEOUT = float(os.getenv("DB_READ_COMMAND_TIMEOUT") or POOL_COMMAND_TIMEOUT)
+# Login/validação de token: poucas consultas curtas. Some os máximos dos três pools
+# por worker ao dimensionar max_connections do Postgres.
+AUTH_POOL_MIN_SIZE = int(os.getenv("DB_AUTH_POOL_MIN", "1"))
+AUTH_POOL_MAX_SIZE = int(os.getenv("DB_AUTH_POOL_MAX") or max(POOL_MAX_SIZE // 2, 2))
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1024"))
+DB_PREFER_UNIX_SOCKET = os.getenv("DB_PREFER_UNIX_SOCKET", "true").lower() in ("1", "true", "yes", "on")
+DB_UNIX_SOCKET_DIR = os.getenv("DB_UNIX_SOCKET_DIR", "/var/run/postgresql")
 DISABLE_API_AUTH = os.getenv("DISABLE_API_AUTH", "true").lower() in ("1", "true", "yes", "on")
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -214,6 +240,28 @@ JWT_EXPIRES_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "60"))
 DEFAULT_ADMIN_USER = os.getenv("DEFAULT_ADMIN_USER")
 DEFAULT_ADMIN_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD")
 APP_INTEGRATION_TOKEN = (os.getenv("APP_INTEGRATION_TOKEN") or "").strip()
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "60"))
+JWT_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+API_USER_CACHE_TTL = float(os.getenv("API_USER_CACHE_TTL", "30"))
+VENDOR_CACHE_TTL = float(os.getenv("VENDOR_CACHE_TTL", "300"))
+VENDOR_CACHE_MAX_SIZE = int(os.getenv("VENDOR_CACHE_MAX_SIZE", "2048"))
+PRODUCT_BATCH_DELAY_MS = float(os.getenv("PRODUCT_BATCH_DELAY_MS", "10"))
+PRODUCT_BATCH_MAX_SIZE = int(os.getenv("PRODUCT_BATCH_MAX_SIZE", "128"))
+LOJA_SYNC_BATCH_SIZE = int(os.getenv("LOJA_SYNC_BATCH_SIZE", "1000"))
+PEDIDO_ITENS_BATCH_SIZE = int(os.getenv("PEDIDO_ITENS_BATCH_SIZE", "500"))
+# Linhas buscadas por vez no cursor das listagens completas enviadas em streaming.
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "500"))
+# Tempo máximo (s) que uma listagem em streaming segura a conexão do read_pool;
+# clientes lentos recebem o corpo truncado quando o prazo acaba.
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "300"))
+CLIENTES_KEYSET_PAGE_SIZE = int(os.getenv("CLIENTES_KEYSET_PAGE_SIZE", "100"))
+ORM_READ_THREADS = int(os.getenv("ORM_READ_THREADS", "16"))
+PASSWORD_HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS") or os.cpu_count() or 2)
+RESPONSE_CACHE_TTL = float(os.getenv("API_RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("API_RESPONSE_CACHE_MAX_SIZE", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("API_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CLIENTES_COUNT_CACHE_TTL = float(os.getenv("CLIENTES_COUNT_CACHE_TTL", "10"))
+SEFAZ_CONFIG_CACHE_TTL = float(os.getenv("SEFAZ_CONFIG_CACHE_TTL", "30"))
 PEDIDO_STATUS_VALUES = {
     "orcamento",
     "pre_venda",
@@ -237,30 +285,104 @@ DISABLE_IMAGE_UPLOAD = os.getenv("DISABLE_IMAGE_UPLOAD", "true").lower() in ("1"
 CLIENTES_LOJA_GLOBAL_CODE = (os.getenv("CLIENTES_LOJA_GLOBAL_CODE") or "00000").strip() or "00000"
 
 
+def _unix_socket_config(config: dict) -> Optional[dict]:
+    """Troca o host local pelo diretório do socket Unix do Postgres, se ele existir."""
+    if not DB_PREFER_UNIX_SOCKET or config["host"] not in ("127.0.0.1", "localhost", "::1"):
+        return None
+    if not os.path.exists(os.path.join(DB_UNIX_SOCKET_DIR, f".s.PGSQL.{config['port']}")):
+        return None
+    return {**config, "host": DB_UNIX_SOCKET_DIR}
+
+
+async def _connect_local_first(factory, config: dict, **kwargs):
+    # Socket Unix evita a pilha TCP de loopback; se o pg_hba recusar a conexão
+    # local (ex.: peer), volta para o host configurado.
+    socket_config = _unix_socket_config(config)
+    if socket_config:
+        try:
+            return await factory(**kwargs, **socket_config)
+        except (OSError, asyncpg.PostgresError):
+            logger.warning(
+                "Socket Unix %s indisponível para %s; usando TCP %s:%s",
+                DB_UNIX_SOCKET_DIR,
+                config["database"],
+                config["host"],
+                config["port"],
+                exc_info=True,
+            )
+    return await factory(**kwargs, **config)
+
+
+async def _init_read_connection(conn: asyncpg.Connection) -> None:
+    # Pool de leitura só serializa valores para JSON (que vira float de qualquer
+    # forma): numeric chega como float e evita montar um Decimal por célula.
+    # O pool de dados mantém Decimal para as gravações.
+    await conn.set_type_codec(
+        "numeric",
+        encoder=str,
+        decoder=float,
+        schema="pg_catalog",
+        format="text",
+    )
+
+
 @app.on_event("startup")
 async def startup():
-    app.state.data_pool = await asyncpg.create_pool(
+    app.state.data_pool = await _connect_local_first(
+        asyncpg.create_pool,
+        DATA_DB_CONFIG,
         min_size=POOL_MIN_SIZE,
         max_size=POOL_MAX_SIZE,
         command_timeout=POOL_COMMAND_TIMEOUT,
-        **DATA_DB_CONFIG,
+        statement_cache_size=STATEMENT_CACHE_SIZE,
+    )
+    # Listagens/consultas (GET) usam um pool próprio, somente leitura, para não
+    # disputar conexões com as sincronizações.
+    app.state.read_pool = await _connect_local_first(
+        asyncpg.create_pool,
+        DATA_DB_CONFIG,
+        min_size=READ_POOL_MIN_SIZE,
+        max_size=READ_POOL_MAX_SIZE,
+        command_timeout=READ_POOL_COMMAND_TIMEOUT,
+        statement_cache_size=STATEMENT_CACHE_SIZE,
+        server_settings={"default_transaction_read_only": "on", "jit": "off"},
+        init=_init_read_connection,
     )
-    app.state.auth_pool = await asyncpg.create_pool(
-        min_size=1,
-        max_size=max(POOL_MAX_SIZE // 2, 2),
+    app.state.auth_pool = await _connect_local_first(
+        asyncpg.create_pool,
+        AUTH_DB_CONFIG,
+        min_size=AUTH_POOL_MIN_SIZE,
+        max_size=AUTH_POOL_MAX_SIZE,
         command_timeout=POOL_COMMAND_TIMEOUT,
-        **AUTH_DB_CONFIG,
+        statement_cache_size=STATEMENT_CACHE_SIZE,
     )
     async with app.state.data_pool.acquire() as conn:
         await _ensure_tenant_tables(conn)
     async with app.state.auth_pool.acquire() as conn:
         await _ensure_auth_tables(conn)
         await _bootstrap_admin_user(conn)
+    # Conexão dedicada: conexões do pool perdem os listeners ao serem devolvidas.
+    try:
+        app.state.auth_listener = await _connect_local_first(asyncpg.connect, AUTH_DB_CONFIG)
+        await app.state.auth_listener.add_listener("api_users_changed", _on_api_users_changed)
+    except Exception:
+        app.state.auth_listener = None
+        logger.warning("LISTEN api_users_changed indisponível; cache de usuários expira só por TTL", exc_info=True)
+    try:
+        app.state.data_listener = await _connect_local_first(asyncpg.connect, DATA_DB_CONFIG)
+        await app.state.data_listener.add_listener("produtos_changed", _on_produtos_changed)
+    except Exception:
+        app.state.data_listener = None
+        logger.warning("LISTEN produtos_changed indisponível; cache de produtos expira só por TTL", exc_info=True)
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    for pool_attr in ("data_pool", "auth_pool"):
+    for listener_attr in ("auth_listener", "data_listener"):
+        listener = getattr(app.state, listener_attr, None)
+        if listener:
+            await listener.close()
+    for pool_attr in ("read_pool", "data_pool", "auth_pool"):
         pool = getattr(app.state, pool_attr, None)
         if pool:
             await pool.close()
@@ -273,6 +395,13 @@ def _get_data_pool():
     return pool
 
 
+def _get_read_pool():
+    pool = getattr(app.state, "read_pool", None)
+    if not pool:
+        return _get_data_pool()
+    return pool
+
+
 def _get_auth_pool():
     pool = getattr(app.state, "auth_pool", None)
     if not pool:
@@ -280,6 +409,26 @@ def _get_auth_pool():
     return pool
 
 
+# Leituras pelo ORM (lojas, pedidos, planos, config SEFAZ) têm limitador de threads
+# próprio: não entram na fila do limitador padrão do threadpool, disputado com hash
+# de senha, criação de pedidos e gravações.
+_orm_read_limiter = anyio.CapacityLimiter(ORM_READ_THREADS)
+
+
+async def _run_orm_read(func, *args):
+    return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=_orm_read_limiter)
+
+
+# Hash/verificação de senha: o OpenSSL solta o GIL durante o PBKDF2/scrypt, então
+# threads já usam todos os núcleos sem o custo de um pool de processos. O limite
+# (um por núcleo) evita que uma rajada de logins ocupe o threadpool padrão.
+_password_hash_limiter = anyio.CapacityLimiter(PASSWORD_HASH_THREADS)
+
+
+async def _run_password_hash(func, *args):
+    return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=_password_hash_limiter)
+
+
 def require_tenant(request: Request) -> str:
     loja_codigo = getattr(request.state, "loja_codigo", None)
     if not loja_codigo:
@@ -297,13 +446,24 @@ def _normalize_loja_codigo(value: Optional[str]) -> str:
     return normalized or "0"
 
 
+# Tabela para str.translate: apaga todo caractere ASCII que não é dígito (loop em C).
+_NON_DIGITS_ASCII = str.maketrans("", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit()))
+_NON_DIGITS_RE = re.compile(r"[^0-9]+")
+
+
+def _only_digits(value: str) -> str:
+    if value.isascii():
+        return value.translate(_NON_DIGITS_ASCII)
+    return _NON_DIGITS_RE.sub("", value)
+
+
 def _normalize_vendor_code(value: Optional[str]) -> str:
     if value is None:
         return ""
     trimmed = value.strip()
     if not trimmed:
         return ""
-    digits = "".join(ch for ch in trimmed if ch.isdigit())
+    digits = _only_digits(trimmed)
     if digits:
         return digits.lstrip("0") or "0"
     return trimmed.lower()
@@ -450,6 +610,31 @@ def _produto_sync_base_sql() -> str:
     """
 
 
+# Colunas de saída das duas consultas base acima (sem preco_updated_at, que só
+# serve para escolher o preço mais recente em /api/products).
+PRODUCT_COLUMNS = (
+    "codigo",
+    "descricao_completa",
+    "referencia",
+    "secao",
+    "grupo",
+    "subgrupo",
+    "unidade",
+    "ean",
+    "plu",
+    "preco_normal",
+    "preco_promocao1",
+    "preco_promocao2",
+    "estoque_disponivel",
+    "loja",
+    "refplu",
+    "row_hash",
+    "custo",
+    "codigo_imagem",
+    "tipo_imagem",
+)
+
+
 def build_product_image_payload(
     codigo_imagem: Optional[str],
     tipo_imagem: Optional[str],
@@ -496,54 +681,86 @@ def _serialize_sefaz_config(config: SefazConfiguration) -> dict:
     }
 
 
-def _plan_to_dict(plan: PlanoPagamentoCliente) -> dict:
+_PLANO_PAGAMENTO_FIELDS = (
+    "cliente_codigo",
+    "plano_codigo",
+    "plano_descricao",
+    "dias_primeira_parcela",
+    "dias_entre_parcelas",
+    "parcelas",
+    "valor_minimo",
+    "valor_acrescimo",
+)
+
+
+def _plan_to_dict(plan: dict) -> dict:
     return {
-        "CLICOD": plan.cliente_codigo,
-        "PLACOD": plan.plano_codigo,
-        "PLADES": plan.plano_descricao or "",
+        "CLICOD": plan["cliente_codigo"],
+        "PLACOD": plan["plano_codigo"],
+        "PLADES": plan["plano_descricao"] or "",
         "PLAENT": Decimal("0"),
-        "PLAINTPRI": plan.dias_primeira_parcela,
-        "PLAINTPAR": plan.dias_entre_parcelas,
-        "PLANUMPAR": plan.parcelas,
-        "PLAVLRMIN": plan.valor_minimo,
-        "PLAVLRACR": plan.valor_acrescimo,
+        "PLAINTPRI": plan["dias_primeira_parcela"],
+        "PLAINTPAR": plan["dias_entre_parcelas"],
+        "PLANUMPAR": plan["parcelas"],
+        "PLAVLRMIN": plan["valor_minimo"],
+        "PLAVLRACR": plan["valor_acrescimo"],
     }
 
-def _fetch_planos_pagamento(cliente_codigo: str, loja_codigo: str) -> list[PlanoPagamentoCliente]:
-    qs = PlanoPagamentoCliente.objects.filter(
-        cliente_codigo=cliente_codigo,
-        loja_codigo=loja_codigo,
-    ).order_by("plano_codigo")
-    plans = list(qs)
-    if plans or (cliente_codigo or "").strip().lower() == "todos":
-        return plans
-    return list(
+def _fetch_planos_pagamento(cliente_codigo: str, loja_codigo: str) -> list[dict]:
+    # Planos do cliente e os genéricos ("todos") vêm na mesma consulta;
+    # os genéricos só são usados quando o cliente não tem planos próprios.
+    is_todos = (cliente_codigo or "").strip().lower() == "todos"
+    codigos = [cliente_codigo] if is_todos else [cliente_codigo, "todos"]
+    rows = list(
         PlanoPagamentoCliente.objects.filter(
-            cliente_codigo="todos",
+            cliente_codigo__in=codigos,
             loja_codigo=loja_codigo,
-        ).order_by("plano_codigo")
+        )
+        .order_by("plano_codigo")
+        .values(*_PLANO_PAGAMENTO_FIELDS)
     )
+    plans = [row for row in rows if row["cliente_codigo"] == cliente_codigo]
+    if plans or is_todos:
+        return plans
+    return [row for row in rows if row["cliente_codigo"] == "todos"]
 
 
-def _loja_to_dict(loja: Loja) -> dict:
-    return {
-        "LOJCOD": loja.codigo,
-        "AGEDES": loja.razao_social or "",
-        "AGEFAN": loja.nome_fantasia or "",
-        "AGECGCCPF": loja.cnpj_cpf or "",
-        "AGECGFRG": loja.ie_rg or "",
-        "AGEPFPJ": loja.tipo_pf_pj or "",
-        "AGETEL1": loja.telefone1 or "",
-        "AGETEL2": loja.telefone2 or "",
-        "AGEEND": loja.endereco or "",
-        "AGEBAI": loja.bairro or "",
-        "AGENUM": loja.numero or "",
-        "AGECPL": loja.complemento or "",
-        "AGECEP": loja.cep or "",
-        "AGECORELE": loja.email or "",
-        "AGECID": loja.cidade or "",
-        "AGEEST": loja.estado or "",
-    }
+def _listar_planos_pagamento(cliente_codigo: str, loja_codigo: str) -> list[dict]:
+    _ensure_plano_pagamentos_schema()
+    return [_plan_to_dict(plan) for plan in _fetch_planos_pagamento(cliente_codigo, loja_codigo)]
+
+
+# Campo do payload do ERP -> campo de Loja (ordem da resposta).
+_LOJA_PAYLOAD_FIELDS = (
+    ("LOJCOD", "codigo"),
+    ("AGEDES", "razao_social"),
+    ("AGEFAN", "nome_fantasia"),
+    ("AGECGCCPF", "cnpj_cpf"),
+    ("AGECGFRG", "ie_rg"),
+    ("AGEPFPJ", "tipo_pf_pj"),
+    ("AGETEL1", "telefone1"),
+    ("AGETEL2", "telefone2"),
+    ("AGEEND", "endereco"),
+    ("AGEBAI", "bairro"),
+    ("AGENUM", "numero"),
+    ("AGECPL", "complemento"),
+    ("AGECEP", "cep"),
+    ("AGECORELE", "email"),
+    ("AGECID", "cidade"),
+    ("AGEEST", "estado"),
+)
+_LOJA_VALUES_FIELDS = tuple(field for _, field in _LOJA_PAYLOAD_FIELDS)
+# Colunas sobrescritas no upsert de /api/lojas/sync (tudo menos a chave).
+_LOJA_UPDATE_FIELDS = tuple(
+    field.name for field in Loja._meta.concrete_fields if field.name not in ("id", "codigo")
+)
+
+
+def _loja_to_dict(loja: dict) -> dict:
+    """Converte uma linha de ``Loja.objects.values(*_LOJA_VALUES_FIELDS)`` no payload do ERP."""
+    data = {key: loja[field] or "" for key, field in _LOJA_PAYLOAD_FIELDS}
+    data["LOJCOD"] = loja["codigo"]
+    return data
 
 
 async def _ensure_auth_tables(conn: asyncpg.Connection) -> None:
@@ -560,6 +777,9 @@ async def _ensure_auth_tables(conn: asyncpg.Connection) -> None:
         );
         ALTER TABLE api_users
         ADD COLUMN IF NOT EXISTS vendor_code VARCHAR(50);
+        -- Login compara lower(username) = $1: sem índice na expressão é seq scan.
+        CREATE INDEX IF NOT EXISTS api_users_username_lower_idx
+        ON api_users (lower(username));
         CREATE OR REPLACE FUNCTION update_updated_at_column()
         RETURNS TRIGGER AS $$
         BEGIN
@@ -578,6 +798,24 @@ async def _ensure_auth_tables(conn: asyncpg.Connection) -> None:
                 EXECUTE PROCEDURE update_updated_at_column();
             END IF;
         END$$;
+        CREATE OR REPLACE FUNCTION notify_api_users_changed()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('api_users_changed', COALESCE(NEW.id, OLD.id)::text);
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger WHERE tgname = 'notify_api_users_changed'
+            ) THEN
+                CREATE TRIGGER notify_api_users_changed
+                AFTER UPDATE OR DELETE ON api_users
+                FOR EACH ROW
+                EXECUTE PROCEDURE notify_api_users_changed();
+            END IF;
+        END$$;
         """
     )
 
@@ -594,66 +832,163 @@ async def _bootstrap_admin_user(conn: asyncpg.Connection) -> None:
         VALUES ($1, $2, TRUE);
         """,
         DEFAULT_ADMIN_USER,
-        _hash_password(DEFAULT_ADMIN_PASSWORD),
+        await _run_password_hash(_hash_password, DEFAULT_ADMIN_PASSWORD),
     )
 
 
-def _hash_password(password: str, iterations: int = 240000) -> str:
+# Senhas novas usam scrypt (hashlib/OpenSSL, sem dependência extra), que é
+# memory-hard. Com N=2^14, r=8, p=1 cada hash leva ~45 ms e 16 MiB, contra
+# ~85 ms do PBKDF2 de 240k iterações; N=2^17 (mínimo da OWASP) leva ~0,4 s e
+# 128 MiB por login, com até PASSWORD_HASH_THREADS logins ao mesmo tempo.
+# Hashes antigos "pbkdf2_sha256$..." continuam válidos, e N/r/p ficam gravados
+# no hash, então hashes com outros parâmetros continuam verificando.
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+def _scrypt_maxmem(n: int, r: int) -> int:
+    # scrypt usa ~128*N*r bytes; o padrão do OpenSSL (32 MiB) recusa N >= 2^15.
+    return 2 * 128 * n * r
+
+
+def _hash_password(password: str) -> str:
     salt = secrets.token_hex(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations)
-    return f"pbkdf2_sha256${iterations}${salt}${base64.b64encode(dk).decode('ascii')}"
+    dk = hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt.encode("ascii"),
+        n=SCRYPT_N,
+        r=SCRYPT_R,
+        p=SCRYPT_P,
+        maxmem=_scrypt_maxmem(SCRYPT_N, SCRYPT_R),
+        dklen=32,
+    )
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt}${base64.b64encode(dk).decode('ascii')}"
 
 
 def _verify_password(password: str, encoded: str) -> bool:
     try:
-        algorithm, iter_str, salt, b64_hash = encoded.split("$", 3)
-        if algorithm != "pbkdf2_sha256":
+        algorithm, params = encoded.split("$", 1)
+        if algorithm == "scrypt":
+            n_str, r_str, p_str, salt, b64_hash = params.split("$", 4)
+            n, r = int(n_str), int(r_str)
+            new_hash = hashlib.scrypt(
+                password.encode("utf-8"),
+                salt=salt.encode("ascii"),
+                n=n,
+                r=r,
+                p=int(p_str),
+                maxmem=_scrypt_maxmem(n, r),
+                dklen=32,
+            )
+        elif algorithm == "pbkdf2_sha256":
+            iter_str, salt, b64_hash = params.split("$", 2)
+            new_hash = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), int(iter_str))
+        else:
             return False
-        iterations = int(iter_str)
     except Exception:
         return False
-    new_hash = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations)
     return hmac.compare_digest(base64.b64encode(new_hash).decode("ascii"), b64_hash)
 
 
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# Cabeçalho do HS256 codificado uma única vez; por token só o payload é serializado e assinado.
+_JWT_HS256_HEADER = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_JWT_SECRET_BYTES = JWT_SECRET.encode("utf-8")
+
+
 def _create_access_token(user_id: int, username: str, vendor_code: Optional[str] = None) -> str:
     now = datetime.now(dt_timezone.utc)
     exp = now + timedelta(minutes=JWT_EXPIRES_MINUTES)
     payload = {
         "sub": str(user_id),
         "username": username,
-        "exp": exp,
-        "iat": now,
+        "exp": int(exp.timestamp()),
+        "iat": int(now.timestamp()),
     }
     if vendor_code:
         payload["vendor_code"] = vendor_code
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    if JWT_ALGORITHM != "HS256":
+        return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    signing_input = _JWT_HS256_HEADER + b"." + _b64url(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(_JWT_SECRET_BYTES, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode("ascii")
 
 
-async def _get_user_by_credentials(username: str, password: str) -> Optional[dict]:
-    normalized_username = (username or "").strip()
-    lowered = normalized_username.lower()
+async def _get_active_user_for_login(username: str) -> Optional[dict]:
+    """Usuário ativo com o hash da senha; a conferência da senha fica com quem chama."""
+    lowered = (username or "").strip().lower()
     pool = _get_auth_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
-            "SELECT id, username, password_hash, vendor_code, is_active FROM api_users WHERE lower(username) = $1;",
+            """
+            SELECT id, username, password_hash, vendor_code, is_active, created_at, updated_at
+            FROM api_users
+            WHERE lower(username) = $1;
+            """,
             lowered,
         )
     if not row or not row["is_active"]:
         return None
-    if not _verify_password(password, row["password_hash"]):
-        return None
-    return {
-        "id": row["id"],
-        "username": row["username"],
-        "vendor_code": row.get("vendor_code"),
-    }
+    return dict(row)
+
+
+# (tipo, chave, loja, geração do sync de clientes) -> (válido até, vendedor ou None).
+# Os vendedores vêm de erp_clientes_vendedores, que só muda em /api/clientes/sync.
+_vendor_cache: dict[tuple, tuple[float, Optional[dict]]] = {}
+# Mesma chave -> consulta em andamento (logins simultâneos do mesmo vendedor fazem uma só).
+_vendor_inflight: dict[tuple, asyncio.Future] = {}
+
+
+async def _cached_vendor_lookup(kind: str, key: str, loja_codigo: str, query) -> Optional[dict]:
+    cache_key = (kind, key, loja_codigo, clientes_module.sync_generation)
+    now = time.time()
+    cached = _vendor_cache.get(cache_key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    pending = _vendor_inflight.get(cache_key)
+    if pending:
+        return await asyncio.shield(pending)
+    future = asyncio.get_running_loop().create_future()
+    _vendor_inflight[cache_key] = future
+    try:
+        vendor = await query()
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # marca como lida se ninguém estiver esperando
+        raise
+    else:
+        future.set_result(vendor)
+    finally:
+        _vendor_inflight.pop(cache_key, None)
+
+    if VENDOR_CACHE_TTL > 0:
+        if len(_vendor_cache) >= VENDOR_CACHE_MAX_SIZE:
+            for stale in [k for k, entry in _vendor_cache.items() if entry[0] <= now]:
+                del _vendor_cache[stale]
+            if len(_vendor_cache) >= VENDOR_CACHE_MAX_SIZE:
+                _vendor_cache.clear()
+        _vendor_cache[cache_key] = (now + VENDOR_CACHE_TTL, vendor)
+    return vendor
 
 
 async def _resolve_vendor_for_username(username: str, loja_codigo: str) -> Optional[dict]:
     raw_name = (username or "").strip().lower()
     if not raw_name:
         return None
+    return await _cached_vendor_lookup(
+        "username",
+        raw_name,
+        loja_codigo,
+        lambda: _query_vendor_for_username(raw_name, loja_codigo),
+    )
+
+
+async def _query_vendor_for_username(raw_name: str, loja_codigo: str) -> Optional[dict]:
     candidates = []
     if raw_name:
         candidates.append(raw_name)
@@ -665,7 +1000,7 @@ async def _resolve_vendor_for_username(username: str, loja_codigo: str) -> Optio
     first_token = simple.split(" ", 1)[0] if simple else ""
     if first_token and first_token not in candidates:
         candidates.append(first_token)
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     async with pool.acquire() as conn:
         for candidate in candidates:
             row = await conn.fetchrow(
@@ -704,7 +1039,16 @@ async def _resolve_vendor_by_code(vendor_code: Optional[str], loja_codigo: str)
     code = (vendor_code or "").strip()
     if not code:
         return None
-    pool = _get_data_pool()
+    return await _cached_vendor_lookup(
+        "code",
+        code.lstrip("0"),
+        loja_codigo,
+        lambda: _query_vendor_by_code(code, loja_codigo),
+    )
+
+
+async def _query_vendor_by_code(code: str, loja_codigo: str) -> Optional[dict]:
+    pool = _get_read_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             f"""
@@ -744,6 +1088,32 @@ class ProdutoSyncIn(BaseModel):
     row_hash: str = ""
 
 
+# Valida o corpo bruto direto no pydantic-core (parse JSON + validação em uma
+# passada), sem montar antes a lista de dicts com json.loads.
+_PRODUTOS_SYNC_ADAPTER = TypeAdapter(List[ProdutoSyncIn])
+PRODUTOS_SYNC_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": ProdutoSyncIn.model_json_schema()},
+            }
+        },
+    }
+}
+
+
+async def _parse_produtos_sync(request: Request) -> List[ProdutoSyncIn]:
+    body = await request.body()
+    try:
+        return _PRODUTOS_SYNC_ADAPTER.validate_json(body)
+    except ValidationError as exc:
+        errors = exc.errors(include_url=False)
+        for error in errors:
+            error["loc"] = ("body", *error["loc"])
+        raise RequestValidationError(errors, body=body) from exc
+
+
 class ClienteOut(BaseModel):
     model_config = ConfigDict(extra="allow")
 
@@ -774,10 +1144,11 @@ class ClienteOut(BaseModel):
 
 
 class ClientesPageOut(BaseModel):
-    total: int
+    total: Optional[int] = None
     data: List[ClienteOut]
     page: Optional[int] = None
     page_size: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class UserOut(BaseModel):
@@ -936,45 +1307,115 @@ PLANOS_PAGAMENTO_SCHEMA = {
 }
 
 
-async def require_jwt(
-    request: Request,
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-) -> dict:
-    if DISABLE_API_AUTH:
-        return {"id": 0, "username": "auth_disabled"}
-    app_token = (request.headers.get("X-App-Token") or "").strip()
-    if APP_INTEGRATION_TOKEN and app_token == APP_INTEGRATION_TOKEN:
-        return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
-    auth_header = (request.headers.get("Authorization") or "").strip()
-    if APP_INTEGRATION_TOKEN and auth_header:
-        scheme, _, raw_value = auth_header.partition(" ")
-        if scheme.lower() in ("bearer", "token", "app") and raw_value.strip() == APP_INTEGRATION_TOKEN:
-            return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
-    if not credentials or credentials.scheme.lower() != "bearer":
-        logger.warning("Auth failed: missing/invalid bearer header")
-        raise HTTPException(401, "Token ausente ou inválido", headers={"WWW-Authenticate": "Bearer"})
-    raw_token = credentials.credentials
-    try:
-        payload = jwt.decode(raw_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        logger.warning("Auth failed: expired token")
-        raise HTTPException(401, "Token expirado", headers={"WWW-Authenticate": "Bearer"})
-    except jwt.InvalidTokenError:
-        logger.warning("Auth failed: invalid token")
-        raise HTTPException(401, "Token inválido", headers={"WWW-Authenticate": "Bearer"})
+# sha256(token) -> (válido até, payload, usuário). Só tokens válidos de usuários ativos entram.
+_token_cache: dict[bytes, tuple[float, dict, dict]] = {}
+# sha256(token) -> validação em andamento (evita decodes repetidos na primeira rajada).
+_token_inflight: dict[bytes, asyncio.Future] = {}
+# user_id -> (válido até, usuário ativo). Invalidado via NOTIFY api_users_changed.
+_api_user_cache: dict[int, tuple[float, dict]] = {}
 
-    user_id = payload.get("sub")
-    username = payload.get("username")
-    if not user_id:
-        raise HTTPException(403, "Token inválido")
 
+async def _get_active_api_user(user_id: int) -> Optional[dict]:
+    now = time.time()
+    cached = _api_user_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
     pool = _get_auth_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             "SELECT id, username, is_active, vendor_code FROM api_users WHERE id = $1;",
-            int(user_id),
+            user_id,
         )
     if not row or not row["is_active"]:
+        _api_user_cache.pop(user_id, None)
+        return None
+    user = {"id": row["id"], "username": row["username"], "vendor_code": row.get("vendor_code")}
+    if API_USER_CACHE_TTL > 0:
+        _api_user_cache[user_id] = (now + API_USER_CACHE_TTL, user)
+    return user
+
+
+def _forget_api_user(user_id: int) -> None:
+    _api_user_cache.pop(user_id, None)
+    for key in [key for key, entry in _token_cache.items() if entry[2]["id"] == user_id]:
+        del _token_cache[key]
+
+
+def _on_api_users_changed(connection, pid, channel, payload) -> None:
+    try:
+        user_id = int(payload)
+    except (TypeError, ValueError):
+        return
+    _forget_api_user(user_id)
+
+
+async def _decode_token_user(raw_token: str) -> tuple[dict, Optional[dict]]:
+    """Valida o JWT e carrega o usuário dono do token.
+
+    Tokens já validados ficam em memória por até ``JWT_CACHE_TTL`` segundos
+    (nunca além do ``exp``), evitando a verificação HMAC e a consulta em
+    ``api_users`` a cada requisição. Requisições simultâneas com o mesmo token
+    esperam a primeira validação. Erros de ``jwt.decode`` são propagados e
+    nunca ficam em cache.
+    """
+    cache_key = hashlib.sha256(raw_token.encode("utf-8")).digest()
+    now = time.time()
+    cached = _token_cache.get(cache_key)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+
+    pending = _token_inflight.get(cache_key)
+    if pending:
+        return await asyncio.shield(pending)
+    future = asyncio.get_running_loop().create_future()
+    _token_inflight[cache_key] = future
+    try:
+        result = await _verify_token_user(raw_token, cache_key, now)
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # marca como lida se ninguém estiver esperando
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _token_inflight.pop(cache_key, None)
+
+
+async def _verify_token_user(raw_token: str, cache_key: bytes, now: float) -> tuple[dict, Optional[dict]]:
+    payload = jwt.decode(raw_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    user_id = payload.get("sub")
+    if not user_id:
+        return payload, None
+    user = await _get_active_api_user(int(user_id))
+    if not user:
+        return payload, None
+
+    if JWT_CACHE_TTL > 0:
+        expires_at = now + JWT_CACHE_TTL
+        if payload.get("exp"):
+            expires_at = min(expires_at, float(payload["exp"]))
+        if len(_token_cache) >= JWT_CACHE_MAX_SIZE:
+            for key in [key for key, entry in _token_cache.items() if entry[0] <= now]:
+                del _token_cache[key]
+            if len(_token_cache) >= JWT_CACHE_MAX_SIZE:
+                _token_cache.clear()
+        _token_cache[cache_key] = (expires_at, payload, user)
+    return payload, user
+
+
+async def _token_user(request: Request, payload: dict, row: Optional[dict]) -> dict:
+    """Monta o usuário autenticado a partir do payload já decodificado.
+
+    O payload fica em ``request.state.jwt_payload``: quem precisar dele no mesmo
+    request reaproveita o decode feito aqui em vez de chamar ``jwt.decode`` de novo.
+    """
+    request.state.jwt_payload = payload
+    user_id = payload.get("sub")
+    username = payload.get("username")
+    if not user_id:
+        raise HTTPException(403, "Token inválido")
+    if not row:
         raise HTTPException(403, "Usuário inativo ou não encontrado")
 
     vendor_code = (payload.get("vendor_code") or "").strip() or None
@@ -995,13 +1436,6 @@ async def require_jwt(
                         vendor_code,
                     )
 
-    logger.info(
-        "Auth ok path=%s user_id=%s username=%s vendor_code=%s",
-        request.url.path,
-        user_id,
-        username,
-        vendor_code or "",
-    )
     return {
         "id": row["id"],
         "username": row["username"],
@@ -1010,6 +1444,44 @@ async def require_jwt(
     }
 
 
+async def require_jwt(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> dict:
+    if DISABLE_API_AUTH:
+        return {"id": 0, "username": "auth_disabled"}
+    app_token = (request.headers.get("X-App-Token") or "").strip()
+    if APP_INTEGRATION_TOKEN and app_token == APP_INTEGRATION_TOKEN:
+        return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
+    auth_header = (request.headers.get("Authorization") or "").strip()
+    if APP_INTEGRATION_TOKEN and auth_header:
+        scheme, _, raw_value = auth_header.partition(" ")
+        if scheme.lower() in ("bearer", "token", "app") and raw_value.strip() == APP_INTEGRATION_TOKEN:
+            return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
+    if not credentials or credentials.scheme.lower() != "bearer":
+        logger.warning("Auth failed: missing/invalid bearer header")
+        raise HTTPException(401, "Token ausente ou inválido", headers={"WWW-Authenticate": "Bearer"})
+    raw_token = credentials.credentials
+    try:
+        payload, row = await _decode_token_user(raw_token)
+    except jwt.ExpiredSignatureError:
+        logger.warning("Auth failed: expired token")
+        raise HTTPException(401, "Token expirado", headers={"WWW-Authenticate": "Bearer"})
+    except jwt.InvalidTokenError:
+        logger.warning("Auth failed: invalid token")
+        raise HTTPException(401, "Token inválido", headers={"WWW-Authenticate": "Bearer"})
+
+    user = await _token_user(request, payload, row)
+    logger.info(
+        "Auth ok path=%s user_id=%s username=%s vendor_code=%s",
+        request.url.path,
+        payload.get("sub"),
+        user["token_username"],
+        user["vendor_code"] or "",
+    )
+    return user
+
+
 async def optional_jwt(
     request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
@@ -1028,7 +1500,7 @@ async def optional_jwt(
         return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
     raw_token = credentials.credentials
     try:
-        payload = jwt.decode(raw_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload, row = await _decode_token_user(raw_token)
     except jwt.ExpiredSignatureError:
         logger.warning("Auth optional: expired token; fallback to anonymous")
         return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
@@ -1036,44 +1508,7 @@ async def optional_jwt(
         logger.warning("Auth optional: invalid token; fallback to anonymous")
         return {"id": 0, "username": "app_token", "vendor_code": None, "is_app_token": True}
 
-    user_id = payload.get("sub")
-    username = payload.get("username")
-    if not user_id:
-        raise HTTPException(403, "Token inválido")
-
-    pool = _get_auth_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT id, username, is_active, vendor_code FROM api_users WHERE id = $1;",
-            int(user_id),
-        )
-    if not row or not row["is_active"]:
-        raise HTTPException(403, "Usuário inativo ou não encontrado")
-
-    vendor_code = (payload.get("vendor_code") or "").strip() or None
-    if not vendor_code:
-        vendor_code = (row.get("vendor_code") or "").strip() or None
-    if not vendor_code:
-        admin_user = (DEFAULT_ADMIN_USER or "").strip()
-        if not (admin_user and (username or "").lower() == admin_user.lower()):
-            loja_codigo = getattr(request.state, "loja_codigo", None)
-            if loja_codigo:
-                resolved = await _resolve_vendor_for_username(username or "", loja_codigo)
-                if resolved:
-                    vendor_code = resolved.get("vendor_code")
-                    logger.info(
-                        "Auth vendor resolved by username=%s loja=%s vendor_code=%s",
-                        username,
-                        loja_codigo,
-                        vendor_code,
-                    )
-
-    return {
-        "id": row["id"],
-        "username": row["username"],
-        "token_username": username,
-        "vendor_code": vendor_code,
-    }
+    return await _token_user(request, payload, row)
 
 
 async def require_admin(token: dict = Depends(require_jwt)) -> dict:
@@ -1186,6 +1621,215 @@ def _normalize_cliente_payload(data: dict) -> dict:
         data["row_hash"] = data["rowhash"]
     data.pop("rowhash", None)
     return data
+
+
+# -----------------------------------
+# Cache de respostas de leitura (por processo)
+# -----------------------------------
+# (namespace, chave) -> (válido até, corpo em bytes). Só entram as listagens
+# completas (sem filtros do cliente), limitadas em RESPONSE_CACHE_MAX_BYTES.
+# Listagens de produtos só mudam nas sincronizações: o worker que sincroniza
+# limpa o namespace e avisa os demais por NOTIFY produtos_changed; o TTL cobre
+# as cargas externas.
+_response_cache: dict[tuple[str, tuple], tuple[float, bytes]] = {}
+_response_cache_bytes = 0
+# Incrementada a cada limpeza: corpos montados antes dela não entram no cache.
+_response_cache_generation: dict[str, int] = {}
+
+
+def _response_cache_get(namespace: str, key: tuple):
+    cached = _response_cache.get((namespace, key))
+    if cached and cached[0] > time.time():
+        return cached[1]
+    return None
+
+
+def _response_cache_drop(cache_key: tuple) -> None:
+    global _response_cache_bytes
+    entry = _response_cache.pop(cache_key, None)
+    if entry:
+        _response_cache_bytes -= len(entry[1])
+
+
+def _response_cache_set(namespace: str, key: tuple, value: bytes, generation: int) -> None:
+    global _response_cache_bytes
+    if RESPONSE_CACHE_TTL <= 0 or len(value) > RESPONSE_CACHE_MAX_BYTES:
+        return
+    if generation != _response_cache_generation.get(namespace, 0):
+        return
+    now = time.time()
+    _response_cache_drop((namespace, key))
+    if (
+        len(_response_cache) >= RESPONSE_CACHE_MAX_SIZE
+        or _response_cache_bytes + len(value) > RESPONSE_CACHE_MAX_BYTES
+    ):
+        for cache_key in [k for k, entry in _response_cache.items() if entry[0] <= now]:
+            _response_cache_drop(cache_key)
+        # Ainda sem espaço: descarta as entradas mais antigas (ordem de inserção).
+        while _response_cache and (
+            len(_response_cache) >= RESPONSE_CACHE_MAX_SIZE
+            or _response_cache_bytes + len(value) > RESPONSE_CACHE_MAX_BYTES
+        ):
+            _response_cache_drop(next(iter(_response_cache)))
+    _response_cache[(namespace, key)] = (now + RESPONSE_CACHE_TTL, value)
+    _response_cache_bytes += len(value)
+
+
+def _response_cache_clear(namespace: str) -> None:
+    _response_cache_generation[namespace] = _response_cache_generation.get(namespace, 0) + 1
+    for cache_key in [k for k in _response_cache if k[0] == namespace]:
+        _response_cache_drop(cache_key)
+
+
+def _on_produtos_changed(connection, pid, channel, payload) -> None:
+    _response_cache_clear("produtos")
+
+
+_clientes_count_cache: dict[tuple, tuple[float, int]] = {}
+
+
+async def _cached_clientes_count(pool, conn, source: str, sql: str, params: list, page_query):
+    """Executa a página e devolve (total, linhas) reaproveitando a contagem recente.
+
+    A contagem filtrada é cacheada por CLIENTES_COUNT_CACHE_TTL segundos e
+    invalidada quando /api/clientes/sync conclui. Sem cache, a contagem roda em
+    outra conexão em paralelo com a página, desde que o pool tenha conexão ociosa.
+    """
+    cache_key = ("count", clientes_module.sync_generation, source, sql, tuple(params))
+    cached = _clientes_count_cache.get(cache_key)
+    if cached and cached[0] > time.time():
+        return cached[1], await page_query(conn)
+
+    if pool.get_idle_size() > 0:
+        async def _count():
+            async with pool.acquire() as count_conn:
+                return await count_conn.fetchval(sql, *params)
+
+        results = await asyncio.gather(_count(), page_query(conn), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        total, rows = results
+    else:
+        total = await conn.fetchval(sql, *params)
+        rows = await page_query(conn)
+
+    if CLIENTES_COUNT_CACHE_TTL > 0:
+        if len(_clientes_count_cache) >= RESPONSE_CACHE_MAX_SIZE:
+            _clientes_count_cache.clear()
+        _clientes_count_cache[cache_key] = (time.time() + CLIENTES_COUNT_CACHE_TTL, total)
+    return total, rows
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        # Mesmo formato do jsonable_encoder: inteiro quando não há casas decimais.
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def _json_bytes(content) -> bytes:
+    """Serializa direto para bytes (orjson quando disponível), sem passar pelo jsonable_encoder."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _json_bytes_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+class _CursorStreamingResponse(StreamingResponse):
+    """StreamingResponse que devolve a conexão do cursor ao pool ao terminar.
+
+    A liberação fica no ``__call__`` e não no ``finally`` do gerador: se o
+    cliente desconecta antes de o Starlette começar a iterar, o gerador nunca
+    roda e a conexão ficaria "idle in transaction" até esgotar o pool.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            with anyio.move_on_after(STREAM_MAX_SECONDS) as deadline:
+                await super().__call__(scope, receive, send)
+            if deadline.cancelled_caught:
+                logger.warning("Streaming interrompido após %ss: %s", STREAM_MAX_SECONDS, scope.get("path"))
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self._release()
+
+
+async def _stream_json_rows(pool, queries, transform, on_complete=None) -> StreamingResponse:
+    """Envia o resultado como array JSON em streaming, lendo de um cursor no servidor.
+
+    ``queries`` são pares (sql, params) tentados em ordem enquanto a tabela não
+    existir (UndefinedTableError). O primeiro lote é lido antes de responder,
+    então erros de consulta ainda viram HTTP 500 em vez de um corpo truncado.
+    ``on_complete`` recebe o corpo inteiro quando o envio termina sem erro.
+    A conexão fica presa ao envio por no máximo STREAM_MAX_SECONDS.
+    """
+    conn = await pool.acquire()
+    tr = None
+
+    async def release():
+        try:
+            if tr is not None:
+                await tr.rollback()
+        finally:
+            await pool.release(conn)
+
+    try:
+        for index, (sql, params) in enumerate(queries):
+            tr = conn.transaction(readonly=True)
+            await tr.start()
+            try:
+                cursor = await conn.cursor(sql, *params)
+                rows = await cursor.fetch(STREAM_FETCH_SIZE)
+                break
+            except asyncpg.UndefinedTableError:
+                await tr.rollback()
+                tr = None
+                if index == len(queries) - 1:
+                    raise
+    except BaseException:
+        await release()
+        raise
+
+    async def body():
+        chunks: list[bytes] | None = [] if on_complete else None
+        batch = rows
+        prefix = b"["
+        while batch:
+            chunk = prefix + b",".join(_json_bytes(transform(dict(row))) for row in batch)
+            prefix = b","
+            if chunks is not None:
+                chunks.append(chunk)
+            yield chunk
+            if len(batch) < STREAM_FETCH_SIZE:
+                break
+            batch = await cursor.fetch(STREAM_FETCH_SIZE)
+        tail = b"[]" if prefix == b"[" else b"]"
+        yield tail
+        if chunks is not None:
+            chunks.append(tail)
+            on_complete(b"".join(chunks))
+
+    return _CursorStreamingResponse(body(), release, media_type="application/json")
+
+
+def _product_list_item(data: dict) -> dict:
+    data.update(build_product_image_payload(data.get("codigo_imagem"), data.get("tipo_imagem")))
+    return _normalize_product_payload(data)
+
+
 # -----------------------------------
 # LISTAR PRODUTOS (tabela já existente)
 # -----------------------------------
@@ -1196,46 +1840,80 @@ async def listar_produtos(
     vendedor_id: Optional[str] = Query(None, alias="vendedor_id"),
     limit: Optional[int] = Query(None),
 ):
-    pool = _get_data_pool()
     resolved_limit = limit if limit is not None and limit > 0 else None
-    async with pool.acquire() as conn:
-        try:
-            base_sql = _produto_base_sql()
-            sql = f"""
-                WITH base AS (
-                    {base_sql}
-                    WHERE {_sql_loja_equals("pr.loja_codigo", 1)}
-                )
-                SELECT DISTINCT ON (codigo) *
-                FROM base
-                ORDER BY codigo, preco_updated_at DESC NULLS LAST
-            """
-            params: list = [loja_codigo]
-            if resolved_limit:
-                sql += f" LIMIT ${len(params) + 1}"
-                params.append(resolved_limit)
-            sql += ";"
-            rows = await conn.fetch(sql, *params)
-        except asyncpg.UndefinedTableError:
-            base_sql = _produto_sync_base_sql()
-            sql = f"""
-                {base_sql}
-                WHERE {_sql_loja_equals("p.loja", 1)}
-                ORDER BY p.codigo
-            """
-            params = [loja_codigo]
-            if resolved_limit:
-                sql += f" LIMIT ${len(params) + 1}"
-                params.append(resolved_limit)
-            sql += ";"
-            rows = await conn.fetch(sql, *params)
-        output = []
-        for row in rows:
-            data = dict(row)
-            data.pop("preco_updated_at", None)
-            data.update(build_product_image_payload(data.get("codigo_imagem"), data.get("tipo_imagem")))
-            output.append(_normalize_product_payload(data))
-        return output
+    # Só o catálogo completo da loja vai para o cache: limit é do cliente.
+    cache_key = ("listar_produtos", loja_codigo)
+    generation = _response_cache_generation.get("produtos", 0)
+    if not resolved_limit:
+        cached = _response_cache_get("produtos", cache_key)
+        if cached is not None:
+            return _json_bytes_response(cached)
+    erp_sql = f"""
+        WITH base AS (
+            {_produto_base_sql()}
+            WHERE {_sql_loja_equals("pr.loja_codigo", 1)}
+        )
+        SELECT DISTINCT ON (codigo) {", ".join(PRODUCT_COLUMNS)}
+        FROM base
+        ORDER BY codigo, preco_updated_at DESC NULLS LAST
+    """
+    sync_sql = f"""
+        {_produto_sync_base_sql()}
+        WHERE {_sql_loja_equals("p.loja", 1)}
+        ORDER BY p.codigo
+    """
+    params: list = [loja_codigo]
+    if resolved_limit:
+        erp_sql += " LIMIT $2"
+        sync_sql += " LIMIT $2"
+        params.append(resolved_limit)
+    # O catálogo completo sai em lotes do cursor; o corpo pronto vai para o
+    # cache só quando o envio termina.
+    return await _stream_json_rows(
+        _get_read_pool(),
+        ((erp_sql, params), (sync_sql, params)),
+        _product_list_item,
+        on_complete=None
+        if resolved_limit
+        else lambda body: _response_cache_set("produtos", cache_key, body, generation),
+    )
+
+
+def _build_listar_produtos_sql(base_sql: str, columns: dict[str, str], shape: tuple[bool, ...]) -> str:
+    has_codigo, has_plu, has_ean, has_q = shape
+    clauses = []
+    index = 0
+    for present, column in ((has_codigo, columns["codigo"]), (has_plu, "p.plu"), (has_ean, "p.ean")):
+        if present:
+            index += 1
+            clauses.append(f"{column} = ${index}")
+    index += 1
+    clauses.append(_sql_loja_equals(columns["loja"], index))
+    if has_q:
+        index += 1
+        clauses.append(
+            f"(p.descricao_completa ILIKE ${index} "
+            f"OR p.referencia ILIKE ${index} "
+            f"OR {columns['codigo']} ILIKE ${index})"
+        )
+    return f"""
+        {base_sql}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {columns['codigo']};
+    """
+
+
+# Todas as combinações de filtro de listar_produtos_sync geradas uma única vez:
+# o texto da consulta fica idêntico entre requisições e o cache de prepared
+# statements do asyncpg (statement_cache_size) reaproveita o plano por conexão.
+_LISTAR_PRODUTOS_SQL = {
+    (source, *shape): _build_listar_produtos_sql(base_sql, columns, shape)
+    for source, base_sql, columns in (
+        ("erp", _produto_base_sql(), {"codigo": "p.produto_codigo", "loja": "pr.loja_codigo"}),
+        ("sync", _produto_sync_base_sql(), {"codigo": "p.codigo", "loja": "p.loja"}),
+    )
+    for shape in itertools.product((False, True), repeat=4)
+}
 
 
 @app.get("/api/produtos-sync", tags=["produtos"])
@@ -1248,76 +1926,40 @@ async def listar_produtos_sync(
     token: dict = Depends(optional_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    clauses = []
-    params = []
-
-    if codigo:
-        params.append(codigo)
-        clauses.append(f"p.produto_codigo = ${len(params)}")
-    if plu:
-        params.append(plu)
-        clauses.append(f"p.plu = ${len(params)}")
-    if ean:
-        params.append(ean)
-        clauses.append(f"p.ean = ${len(params)}")
     if loja and not _loja_matches(loja, loja_codigo):
         raise HTTPException(403, "Loja não autorizada")
-    _append_loja_scope(clauses, params, loja_codigo, "pr.loja_codigo")
+    if not loja_codigo:
+        raise HTTPException(500, "Loja não resolvida")
+
+    shape = (bool(codigo), bool(plu), bool(ean), bool(q))
+    params = [value for value in (codigo, plu, ean) if value]
+    params.append(loja_codigo)
     if q:
         params.append(f"%{q}%")
-        clauses.append(
-            f"(p.descricao_completa ILIKE ${len(params)} "
-            f"OR p.referencia ILIKE ${len(params)} "
-            f"OR p.produto_codigo ILIKE ${len(params)})"
-        )
 
-    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    pool = _get_data_pool()
+    # Só a listagem sem filtros entra no cache: q/codigo/plu/ean são do cliente.
+    cacheable = not any(shape)
+    cache_key = ("listar_produtos_sync", loja_codigo)
+    generation = _response_cache_generation.get("produtos", 0)
+    if cacheable:
+        cached = _response_cache_get("produtos", cache_key)
+        if cached is not None:
+            return _json_bytes_response(cached)
+    pool = _get_read_pool()
     async with pool.acquire() as conn:
         try:
-            base_sql = _produto_base_sql()
-            sql = f"""
-                {base_sql}
-                {where_sql}
-                ORDER BY p.produto_codigo;
-            """
-            rows = await conn.fetch(sql, *params)
+            rows = await conn.fetch(_LISTAR_PRODUTOS_SQL[("erp", *shape)], *params)
         except asyncpg.UndefinedTableError:
-            sync_clauses = []
-            sync_params = []
-            if codigo:
-                sync_params.append(codigo)
-                sync_clauses.append(f"p.codigo = ${len(sync_params)}")
-            if plu:
-                sync_params.append(plu)
-                sync_clauses.append(f"p.plu = ${len(sync_params)}")
-            if ean:
-                sync_params.append(ean)
-                sync_clauses.append(f"p.ean = ${len(sync_params)}")
-            if loja and not _loja_matches(loja, loja_codigo):
-                raise HTTPException(403, "Loja não autorizada")
-            _append_loja_scope(sync_clauses, sync_params, loja_codigo, "p.loja")
-            if q:
-                sync_params.append(f"%{q}%")
-                sync_clauses.append(
-                    f"(p.descricao_completa ILIKE ${len(sync_params)} "
-                    f"OR p.referencia ILIKE ${len(sync_params)} "
-                    f"OR p.codigo ILIKE ${len(sync_params)})"
-                )
-            sync_where_sql = f"WHERE {' AND '.join(sync_clauses)}" if sync_clauses else ""
-            base_sql = _produto_sync_base_sql()
-            sql = f"""
-                {base_sql}
-                {sync_where_sql}
-                ORDER BY p.codigo;
-            """
-            rows = await conn.fetch(sql, *sync_params)
+            rows = await conn.fetch(_LISTAR_PRODUTOS_SQL[("sync", *shape)], *params)
     output = []
     for row in rows:
         data = dict(row)
         data.update(build_product_image_payload(data.get("codigo_imagem"), data.get("tipo_imagem")))
         output.append(_normalize_product_payload(data))
-    return output
+    body = _json_bytes(output)
+    if cacheable:
+        _response_cache_set("produtos", cache_key, body, generation)
+    return _json_bytes_response(body)
 
 
 @app.get("/api/produtos", tags=["produtos"])
@@ -1341,36 +1983,105 @@ async def listar_produtos_alias(
     )
 
 
+class _ProductLookupBatcher:
+    """Agrupa buscas unitárias concorrentes de produto em uma única consulta ``= ANY($1)``.
+
+    Clientes móveis consultam um produto por requisição em laços apertados; as
+    chaves que chegam dentro de PRODUCT_BATCH_DELAY_MS (por loja) viram um só
+    ``fetch`` e cada requisição recebe a sua linha.
+    """
+
+    def __init__(self, erp_column: str, sync_column: str, result_field: str):
+        self.erp_column = erp_column
+        self.sync_column = sync_column
+        self.result_field = result_field
+        self._pending: dict[str, dict[str, list[asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get(self, key: str, loja_codigo: str):
+        if PRODUCT_BATCH_DELAY_MS <= 0:
+            rows = await self._fetch([key], loja_codigo)
+            return rows.get(key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(loja_codigo, {})
+        batch.setdefault(key, []).append(future)
+        if len(batch) >= PRODUCT_BATCH_MAX_SIZE:
+            self._flush(loja_codigo)
+        elif loja_codigo not in self._timers:
+            self._timers[loja_codigo] = loop.call_later(
+                PRODUCT_BATCH_DELAY_MS / 1000,
+                self._flush,
+                loja_codigo,
+            )
+        return await future
+
+    def _flush(self, loja_codigo: str) -> None:
+        timer = self._timers.pop(loja_codigo, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(loja_codigo, None)
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._resolve(batch, loja_codigo))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: dict[str, list[asyncio.Future]], loja_codigo: str) -> None:
+        try:
+            rows = await self._fetch(list(batch), loja_codigo)
+        except Exception as exc:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+        for key, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(rows.get(key))
+
+    async def _fetch(self, keys: list[str], loja_codigo: str) -> dict:
+        pool = _get_read_pool()
+        async with pool.acquire() as conn:
+            try:
+                rows = await conn.fetch(
+                    f"""
+                    {_produto_base_sql()}
+                    WHERE {self.erp_column} = ANY($1::text[])
+                      AND {_sql_loja_equals("pr.loja_codigo", 2)};
+                    """,
+                    keys,
+                    loja_codigo,
+                )
+            except asyncpg.UndefinedTableError:
+                rows = await conn.fetch(
+                    f"""
+                    {_produto_sync_base_sql()}
+                    WHERE {self.sync_column} = ANY($1::text[])
+                      AND {_sql_loja_equals("p.loja", 2)};
+                    """,
+                    keys,
+                    loja_codigo,
+                )
+        result = {}
+        for row in rows:
+            result.setdefault(row[self.result_field], row)
+        return result
+
+
+_produto_por_codigo_batcher = _ProductLookupBatcher("p.produto_codigo", "p.codigo", "codigo")
+_produto_por_plu_batcher = _ProductLookupBatcher("p.plu", "p.plu", "plu")
+
+
 @app.get("/api/produtos-sync/{codigo}", tags=["produtos"])
 async def produto_por_codigo(
     codigo: str,
     token: dict = Depends(optional_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    pool = _get_data_pool()
-    async with pool.acquire() as conn:
-        try:
-            base_sql = _produto_base_sql()
-            row = await conn.fetchrow(
-                f"""
-                {base_sql}
-                WHERE p.produto_codigo = $1
-                  AND {_sql_loja_equals("pr.loja_codigo", 2)};
-                """,
-                codigo,
-                loja_codigo,
-            )
-        except asyncpg.UndefinedTableError:
-            base_sql = _produto_sync_base_sql()
-            row = await conn.fetchrow(
-                f"""
-                {base_sql}
-                WHERE p.codigo = $1
-                  AND {_sql_loja_equals("p.loja", 2)};
-                """,
-                codigo,
-                loja_codigo,
-            )
+    row = await _produto_por_codigo_batcher.get(codigo, loja_codigo)
     if not row:
         raise HTTPException(404, "Produto não encontrado")
     data = dict(row)
@@ -1393,7 +2104,7 @@ async def produto_por_codigo_ou_plu(
     token: dict = Depends(optional_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     async with pool.acquire() as conn:
         try:
             base_sql = _produto_base_sql()
@@ -1452,31 +2163,7 @@ async def produto_por_plu(
     token: dict = Depends(optional_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    pool = _get_data_pool()
-    async with pool.acquire() as conn:
-        try:
-            base_sql = _produto_base_sql()
-            row = await conn.fetchrow(
-                f"""
-                {base_sql}
-                WHERE p.plu = $1
-                  AND {_sql_loja_equals("pr.loja_codigo", 2)};
-                """,
-                plu,
-                loja_codigo,
-            )
-        except asyncpg.UndefinedTableError:
-            base_sql = _produto_sync_base_sql()
-            row = await conn.fetchrow(
-                f"""
-                {base_sql}
-                WHERE p.plu = $1
-                  AND {_sql_loja_equals("p.loja", 2)};
-                """,
-                plu,
-                loja_codigo,
-            )
-
+    row = await _produto_por_plu_batcher.get(plu, loja_codigo)
     if not row:
         raise HTTPException(404, "Produto não encontrado")
     data = dict(row)
@@ -1493,7 +2180,7 @@ async def buscar_produto(
     token: dict = Depends(optional_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     async with pool.acquire() as conn:
         try:
             base_sql = _produto_base_sql()
@@ -1519,12 +2206,12 @@ async def buscar_produto(
                 f"%{q}%",
                 loja_codigo,
             )
-        output = []
-        for row in rows:
-            data = dict(row)
-            data.update(build_product_image_payload(data.get("codigo_imagem"), data.get("tipo_imagem")))
-            output.append(data)
-        return output
+    output = []
+    for row in rows:
+        data = dict(row)
+        data.update(build_product_image_payload(data.get("codigo_imagem"), data.get("tipo_imagem")))
+        output.append(data)
+    return _json_bytes_response(_json_bytes(output))
 
 
 
@@ -1532,16 +2219,46 @@ async def buscar_produto(
 # -----------------------------------
 # SINCRONIZAÇÃO DE PRODUTOS
 # -----------------------------------
-@app.post("/api/products/sync", tags=["produtos"])
+async def _copy_to_stage(
+    conn: asyncpg.Connection,
+    table: str,
+    stage: str,
+    columns: tuple[str, ...],
+    records,
+) -> None:
+    """Cria ``stage`` (temporária, descartada no commit) com os tipos de ``table`` e carrega via COPY."""
+    column_list = ", ".join(columns)
+    await conn.execute(
+        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA;"
+    )
+    await conn.copy_records_to_table(stage, records=records, columns=columns)
+
+
+@app.post("/api/products/sync", tags=["produtos"], openapi_extra=PRODUTOS_SYNC_OPENAPI)
 async def sync_products(
-    produtos: List[ProdutoSyncIn],
+    produtos: List[ProdutoSyncIn] = Depends(_parse_produtos_sync),
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
     pool = _get_data_pool()
     is_admin = _is_admin_token(token)
 
-    insert_cadastro_sql = """
+    # Os lotes chegam via COPY em tabelas temporárias e cada tabela recebe um
+    # único INSERT ... SELECT ... ON CONFLICT (em vez de um Bind/Execute por linha).
+    cadastro_columns = (
+        "produto_codigo",
+        "descricao_completa",
+        "referencia",
+        "secao",
+        "grupo",
+        "subgrupo",
+        "unidade",
+        "ean",
+        "plu",
+        "refplu",
+        "row_hash",
+    )
+    upsert_cadastro_sql = """
         INSERT INTO erp_produtos (
             produto_codigo,
             descricao_completa,
@@ -1556,9 +2273,20 @@ async def sync_products(
             row_hash,
             updated_at
         )
-        VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, NOW()
-        )
+        SELECT
+            produto_codigo,
+            descricao_completa,
+            referencia,
+            secao,
+            grupo,
+            subgrupo,
+            unidade,
+            ean,
+            plu,
+            refplu,
+            row_hash,
+            NOW()
+        FROM _stage_produtos
         ON CONFLICT (produto_codigo) DO UPDATE SET
             descricao_completa = EXCLUDED.descricao_completa,
             referencia = EXCLUDED.referencia,
@@ -1573,7 +2301,15 @@ async def sync_products(
             updated_at = NOW();
     """
 
-    insert_precos_sql = """
+    precos_columns = (
+        "produto_codigo",
+        "loja_codigo",
+        "preco_normal",
+        "preco_promocao1",
+        "preco_promocao2",
+        "custo",
+    )
+    upsert_precos_sql = """
         INSERT INTO erp_produtos_precos (
             produto_codigo,
             loja_codigo,
@@ -1583,7 +2319,8 @@ async def sync_products(
             custo,
             updated_at
         )
-        VALUES ($1, $2, $3, $4, $5, $6, NOW())
+        SELECT produto_codigo, loja_codigo, preco_normal, preco_promocao1, preco_promocao2, custo, NOW()
+        FROM _stage_precos
         ON CONFLICT (produto_codigo, loja_codigo) DO UPDATE SET
             preco_normal = EXCLUDED.preco_normal,
             preco_promocao1 = EXCLUDED.preco_promocao1,
@@ -1592,20 +2329,45 @@ async def sync_products(
             updated_at = NOW();
     """
 
-    insert_estoque_sql = """
+    estoque_columns = (
+        "produto_codigo",
+        "loja_codigo",
+        "estoque_disponivel",
+    )
+    upsert_estoque_sql = """
         INSERT INTO erp_produtos_estoque (
             produto_codigo,
             loja_codigo,
             estoque_disponivel,
             updated_at
         )
-        VALUES ($1, $2, $3, NOW())
+        SELECT produto_codigo, loja_codigo, estoque_disponivel, NOW()
+        FROM _stage_estoque
         ON CONFLICT (produto_codigo, loja_codigo) DO UPDATE SET
             estoque_disponivel = EXCLUDED.estoque_disponivel,
             updated_at = NOW();
     """
 
-    insert_sync_sql = """
+    sync_columns = (
+        "codigo",
+        "descricao_completa",
+        "referencia",
+        "secao",
+        "grupo",
+        "subgrupo",
+        "unidade",
+        "ean",
+        "plu",
+        "preco_normal",
+        "preco_promocao1",
+        "preco_promocao2",
+        "estoque_disponivel",
+        "loja",
+        "refplu",
+        "row_hash",
+        "custo",
+    )
+    upsert_sync_sql = """
         INSERT INTO erp_produtos_sync (
             codigo,
             descricao_completa,
@@ -1626,9 +2388,26 @@ async def sync_products(
             custo,
             updated_at
         )
-        VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, NOW()
-        )
+        SELECT
+            codigo,
+            descricao_completa,
+            referencia,
+            secao,
+            grupo,
+            subgrupo,
+            unidade,
+            ean,
+            plu,
+            preco_normal,
+            preco_promocao1,
+            preco_promocao2,
+            estoque_disponivel,
+            loja,
+            refplu,
+            row_hash,
+            custo,
+            NOW()
+        FROM _stage_sync
         ON CONFLICT (codigo, loja) DO UPDATE SET
             descricao_completa = EXCLUDED.descricao_completa,
             referencia = EXCLUDED.referencia,
@@ -1656,8 +2435,10 @@ async def sync_products(
         return loja_codigo
 
     resolved_lojas = [resolve_loja(p.loja) for p in produtos]
-    cadastro_payload = [
-        (
+    # Um mesmo INSERT ... ON CONFLICT não pode tocar a mesma linha duas vezes:
+    # chaves repetidas no lote ficam com a última ocorrência, como no executemany.
+    cadastro_payload = {
+        p.codigo: (
             p.codigo,
             p.descricao_completa,
             p.referencia,
@@ -1671,9 +2452,9 @@ async def sync_products(
             p.row_hash,
         )
         for p in produtos
-    ]
-    precos_payload = [
-        (
+    }
+    precos_payload = {
+        (p.codigo, resolved_lojas[idx]): (
             p.codigo,
             resolved_lojas[idx],
             p.preco_normal,
@@ -1682,17 +2463,17 @@ async def sync_products(
             p.custo,
         )
         for idx, p in enumerate(produtos)
-    ]
-    estoque_payload = [
-        (
+    }
+    estoque_payload = {
+        (p.codigo, resolved_lojas[idx]): (
             p.codigo,
             resolved_lojas[idx],
             p.estoque_disponivel,
         )
         for idx, p in enumerate(produtos)
-    ]
-    sync_payload = [
-        (
+    }
+    sync_payload = {
+        (p.codigo, resolved_lojas[idx]): (
             p.codigo,
             p.descricao_completa,
             p.referencia,
@@ -1712,15 +2493,22 @@ async def sync_products(
             p.custo,
         )
         for idx, p in enumerate(produtos)
-    ]
+    }
 
     try:
         async with pool.acquire() as conn:
             async with conn.transaction():
-                await conn.executemany(insert_cadastro_sql, cadastro_payload)
-                await conn.executemany(insert_precos_sql, precos_payload)
-                await conn.executemany(insert_estoque_sql, estoque_payload)
-                await conn.executemany(insert_sync_sql, sync_payload)
+                await _copy_to_stage(conn, "erp_produtos", "_stage_produtos", cadastro_columns, cadastro_payload.values())
+                await conn.execute(upsert_cadastro_sql)
+                await _copy_to_stage(conn, "erp_produtos_precos", "_stage_precos", precos_columns, precos_payload.values())
+                await conn.execute(upsert_precos_sql)
+                await _copy_to_stage(conn, "erp_produtos_estoque", "_stage_estoque", estoque_columns, estoque_payload.values())
+                await conn.execute(upsert_estoque_sql)
+                await _copy_to_stage(conn, "erp_produtos_sync", "_stage_sync", sync_columns, sync_payload.values())
+                await conn.execute(upsert_sync_sql)
+                # Entregue no commit: os outros workers limpam o próprio cache.
+                await conn.execute("SELECT pg_notify('produtos_changed', '');")
+        _response_cache_clear("produtos")
         return {"status": "ok", "total": len(produtos)}
 
     except Exception as e:
@@ -1730,6 +2518,125 @@ async def sync_products(
 # -----------------------------------
 # CLIENTES
 # -----------------------------------
+def _all_clientes_queries(token: dict, loja_codigo: str, vendor_override: Optional[str]) -> list[tuple[str, list]]:
+    """Consultas (erp_clientes e o fallback erp_clientes_vendedores) de todos os clientes visíveis."""
+    join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
+    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    fallback_clauses, fallback_params = _build_cliente_fallback_scope(
+        token,
+        loja_codigo,
+        vendor_override,
+    )
+    fallback_where_sql = f"WHERE {' AND '.join(fallback_clauses)}" if fallback_clauses else ""
+    return [
+        (
+            f"""
+            SELECT c.*
+            FROM erp_clientes c
+            {join_sql}
+            {where_sql}
+            ORDER BY c.cliente_codigo
+            """,
+            params,
+        ),
+        (
+            f"""
+            SELECT DISTINCT ON (c.cliente_codigo) c.*
+            FROM erp_clientes_vendedores c
+            {fallback_where_sql}
+            ORDER BY c.cliente_codigo, c.updated_at DESC
+            """,
+            fallback_params,
+        ),
+    ]
+
+
+async def _fetch_all_clientes(conn, token: dict, loja_codigo: str, vendor_override: Optional[str]) -> list:
+    """Todos os clientes visíveis para o token, sem paginação (ordenados por código)."""
+    (sql, params), (fallback_sql, fallback_params) = _all_clientes_queries(token, loja_codigo, vendor_override)
+    try:
+        return await conn.fetch(sql, *params)
+    except asyncpg.UndefinedTableError:
+        return await conn.fetch(fallback_sql, *fallback_params)
+
+
+async def _listar_clientes_keyset(
+    pool,
+    token: dict,
+    loja_codigo: str,
+    vendor_override: Optional[str],
+    after: str,
+    page_size: int,
+    with_total: bool,
+) -> dict:
+    """Página seguinte a ``after`` pelo índice de cliente_codigo (sem OFFSET).
+
+    ``after`` vazio começa do início. A contagem só roda com ``with_total`` e
+    reaproveita o cache de _cached_clientes_count.
+    """
+    join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
+    fallback_clauses, fallback_params = _build_cliente_fallback_scope(token, loja_codigo, vendor_override)
+    queries = []
+    for table, select_sql, order_sql, scope_clauses, scope_params in (
+        ("erp_clientes", f"SELECT c.* FROM erp_clientes c {join_sql}", "c.cliente_codigo", clauses, params),
+        (
+            "erp_clientes_vendedores",
+            "SELECT DISTINCT ON (c.cliente_codigo) c.* FROM erp_clientes_vendedores c",
+            "c.cliente_codigo, c.updated_at DESC",
+            fallback_clauses,
+            fallback_params,
+        ),
+    ):
+        count_select = (
+            f"SELECT COUNT(*) FROM erp_clientes c {join_sql}"
+            if table == "erp_clientes"
+            else "SELECT COUNT(DISTINCT c.cliente_codigo) FROM erp_clientes_vendedores c"
+        )
+        count_where = f"WHERE {' AND '.join(scope_clauses)}" if scope_clauses else ""
+        page_clauses = list(scope_clauses)
+        page_params = list(scope_params)
+        if after:
+            page_params.append(after)
+            page_clauses.append(f"c.cliente_codigo > ${len(page_params)}")
+        page_where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+        page_params.append(page_size)
+        queries.append(
+            (
+                table,
+                f"{count_select} {count_where};",
+                scope_params,
+                f"{select_sql} {page_where} ORDER BY {order_sql} LIMIT ${len(page_params)};",
+                page_params,
+            )
+        )
+
+    async with pool.acquire() as conn:
+        for index, (table, count_sql, count_params, page_sql, page_params) in enumerate(queries):
+            try:
+                if with_total:
+                    total, rows = await _cached_clientes_count(
+                        pool,
+                        conn,
+                        table,
+                        count_sql,
+                        count_params,
+                        lambda page_conn: page_conn.fetch(page_sql, *page_params),
+                    )
+                else:
+                    total, rows = None, await conn.fetch(page_sql, *page_params)
+                break
+            except asyncpg.UndefinedTableError:
+                if index == len(queries) - 1:
+                    raise
+
+    return {
+        "total": total,
+        "data": [_normalize_cliente_payload(dict(r)) for r in rows],
+        "page_size": page_size,
+        "next_cursor": rows[-1]["cliente_codigo"] if len(rows) == page_size else None,
+    }
+
+
 @app.get("/api/clientes", tags=["clientes"], response_model=ClientesPageOut)
 async def listar_clientes(
     token: dict = Depends(optional_jwt),
@@ -1739,23 +2646,45 @@ async def listar_clientes(
     limit: Optional[int] = Query(None, alias="limit"),
     page: int = Query(1, ge=1),
     page_size: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = Query(None, description="Último cliente_codigo recebido (paginação por chave)"),
+    with_total: bool = Query(False, description="Inclui o total na paginação por chave"),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     vendor_override = (vendedor_id or cod_vendedor or "").strip() or None
     if limit is not None and limit > 0 and not page_size:
         page_size = limit
+    if after is not None:
+        return await _listar_clientes_keyset(
+            pool,
+            token,
+            loja_codigo,
+            vendor_override,
+            after.strip(),
+            page_size or CLIENTES_KEYSET_PAGE_SIZE,
+            with_total,
+        )
+    if not page_size:
+        # Sem paginação todas as linhas voltam; o total é o próprio tamanho.
+        async with pool.acquire() as conn:
+            rows = await _fetch_all_clientes(conn, token, loja_codigo, vendor_override)
+        return {
+            "total": len(rows),
+            "data": [_normalize_cliente_payload(dict(r)) for r in rows],
+        }
+
+    offset = (page - 1) * page_size
     join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
     where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     async with pool.acquire() as conn:
         try:
-            total = await conn.fetchval(
+            params_with_page = [*params, offset, page_size]
+            total, rows = await _cached_clientes_count(
+                pool,
+                conn,
+                "erp_clientes",
                 f"SELECT COUNT(*) FROM erp_clientes c {join_sql} {where_sql};",
-                *params,
-            )
-            if page_size:
-                offset = (page - 1) * page_size
-                params_with_page = [*params, offset, page_size]
-                rows = await conn.fetch(
+                params,
+                lambda page_conn: page_conn.fetch(
                     f"""
                     SELECT c.*
                     FROM erp_clientes c
@@ -1765,18 +2694,8 @@ async def listar_clientes(
                     OFFSET ${len(params) + 1} LIMIT ${len(params) + 2};
                     """,
                     *params_with_page,
-                )
-            else:
-                rows = await conn.fetch(
-                    f"""
-                    SELECT c.*
-                    FROM erp_clientes c
-                    {join_sql}
-                    {where_sql}
-                    ORDER BY c.cliente_codigo;
-                    """,
-                    *params,
-                )
+                ),
+            )
         except asyncpg.UndefinedTableError:
             fallback_clauses, fallback_params = _build_cliente_fallback_scope(
                 token,
@@ -1784,14 +2703,14 @@ async def listar_clientes(
                 vendor_override,
             )
             fallback_where_sql = f"WHERE {' AND '.join(fallback_clauses)}" if fallback_clauses else ""
-            total = await conn.fetchval(
+            params_with_page = [*fallback_params, offset, page_size]
+            total, rows = await _cached_clientes_count(
+                pool,
+                conn,
+                "erp_clientes_vendedores",
                 f"SELECT COUNT(DISTINCT c.cliente_codigo) FROM erp_clientes_vendedores c {fallback_where_sql};",
-                *fallback_params,
-            )
-            if page_size:
-                offset = (page - 1) * page_size
-                params_with_page = [*fallback_params, offset, page_size]
-                rows = await conn.fetch(
+                fallback_params,
+                lambda page_conn: page_conn.fetch(
                     f"""
                     SELECT DISTINCT ON (c.cliente_codigo) c.*
                     FROM erp_clientes_vendedores c
@@ -1800,27 +2719,15 @@ async def listar_clientes(
                     OFFSET ${len(fallback_params) + 1} LIMIT ${len(fallback_params) + 2};
                     """,
                     *params_with_page,
-                )
-            else:
-                rows = await conn.fetch(
-                    f"""
-                    SELECT DISTINCT ON (c.cliente_codigo) c.*
-                    FROM erp_clientes_vendedores c
-                    {fallback_where_sql}
-                    ORDER BY c.cliente_codigo, c.updated_at DESC;
-                    """,
-                    *fallback_params,
-                )
+                ),
+            )
 
-    data = [_normalize_cliente_payload(dict(r)) for r in rows]
-    response = {
+    return {
         "total": total,
-        "data": data,
+        "data": [_normalize_cliente_payload(dict(r)) for r in rows],
+        "page": page,
+        "page_size": page_size,
     }
-    if page_size:
-        response["page"] = page
-        response["page_size"] = page_size
-    return response
 
 
 @app.get("/api/inadimplencia", tags=["inadimplencia"])
@@ -1833,7 +2740,7 @@ async def listar_inadimplencia(
     vencido: Optional[bool] = Query(None),
     limit: Optional[int] = Query(None),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     clauses: list[str] = []
     params: list = []
 
@@ -1867,46 +2774,10 @@ async def listar_inadimplencia(
     return [_normalize_cliente_payload(dict(r)) for r in rows]
 
 
-@app.get("/api/clientes/lista", tags=["clientes"], response_model=List[ClienteOut])
-async def listar_clientes_lista(
-    token: dict = Depends(optional_jwt),
-    loja_codigo: str = Depends(require_tenant),
-    vendedor_id: Optional[str] = Query(None, alias="vendedor_id"),
-    cod_vendedor: Optional[str] = Query(None, alias="cod_vendedor"),
-):
-    pool = _get_data_pool()
-    vendor_override = (vendedor_id or cod_vendedor or "").strip() or None
-    join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
-    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    async with pool.acquire() as conn:
-        try:
-            rows = await conn.fetch(
-                f"""
-                SELECT c.*
-                FROM erp_clientes c
-                {join_sql}
-                {where_sql}
-                ORDER BY c.cliente_codigo;
-                """,
-                *params,
-            )
-        except asyncpg.UndefinedTableError:
-            fallback_clauses, fallback_params = _build_cliente_fallback_scope(
-                token,
-                loja_codigo,
-                vendor_override,
-            )
-            fallback_where_sql = f"WHERE {' AND '.join(fallback_clauses)}" if fallback_clauses else ""
-            rows = await conn.fetch(
-                f"""
-                SELECT DISTINCT ON (c.cliente_codigo) c.*
-                FROM erp_clientes_vendedores c
-                {fallback_where_sql}
-                ORDER BY c.cliente_codigo, c.updated_at DESC;
-                """,
-                *fallback_params,
-            )
-    return [_normalize_cliente_payload(dict(r)) for r in rows]
+def _cliente_out_json(data: dict) -> dict:
+    # O streaming não passa pelo response_model: serializa pelo ClienteOut aqui
+    # para manter a mesma saída (campos nulos, coerções e datas em "Z").
+    return ClienteOut.model_validate(_normalize_cliente_payload(data)).model_dump(mode="json")
 
 
 @app.get("/api/clientes/lista", tags=["clientes"], response_model=List[ClienteOut])
@@ -1916,39 +2787,12 @@ async def listar_clientes_lista(
     vendedor_id: Optional[str] = Query(None, alias="vendedor_id"),
     cod_vendedor: Optional[str] = Query(None, alias="cod_vendedor"),
 ):
-    pool = _get_data_pool()
     vendor_override = (vendedor_id or cod_vendedor or "").strip() or None
-    join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
-    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    async with pool.acquire() as conn:
-        try:
-            rows = await conn.fetch(
-                f"""
-                SELECT c.*
-                FROM erp_clientes c
-                {join_sql}
-                {where_sql}
-                ORDER BY c.cliente_codigo;
-                """,
-                *params,
-            )
-        except asyncpg.UndefinedTableError:
-            fallback_clauses, fallback_params = _build_cliente_fallback_scope(
-                token,
-                loja_codigo,
-                vendor_override,
-            )
-            fallback_where_sql = f"WHERE {' AND '.join(fallback_clauses)}" if fallback_clauses else ""
-            rows = await conn.fetch(
-                f"""
-                SELECT DISTINCT ON (c.cliente_codigo) c.*
-                FROM erp_clientes_vendedores c
-                {fallback_where_sql}
-                ORDER BY c.cliente_codigo, c.updated_at DESC;
-                """,
-                *fallback_params,
-            )
-    return [dict(r) for r in rows]
+    return await _stream_json_rows(
+        _get_read_pool(),
+        _all_clientes_queries(token, loja_codigo, vendor_override),
+        _cliente_out_json,
+    )
 
 
 @app.get("/api/clientes/{cliente_codigo}", tags=["clientes"], response_model=ClienteOut)
@@ -1958,7 +2802,7 @@ async def cliente_por_codigo(
     loja_codigo: str = Depends(require_tenant),
     vendedor_id: Optional[str] = Query(None, alias="vendedor_id"),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     vendor_override = (vendedor_id or "").strip() or None
     join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
     params.append(cliente_codigo)
@@ -2006,7 +2850,7 @@ async def buscar_cliente(
     loja_codigo: str = Depends(require_tenant),
     vendedor_id: Optional[str] = Query(None, alias="vendedor_id"),
 ):
-    pool = _get_data_pool()
+    pool = _get_read_pool()
     like = f"%{q}%"
     vendor_override = (vendedor_id or "").strip() or None
     join_sql, clauses, params = _build_cliente_scope(token, loja_codigo, vendor_override)
@@ -2056,7 +2900,14 @@ async def buscar_cliente(
 # -----------------------------------
 # PLANOS DE PAGAMENTO (Postgres)
 # -----------------------------------
+_plano_pagamentos_schema_ok = False
+
+
 def _ensure_plano_pagamentos_schema() -> None:
+    # As verificações de catálogo só precisam rodar uma vez por processo.
+    global _plano_pagamentos_schema_ok
+    if _plano_pagamentos_schema_ok:
+        return
     with connection.cursor() as cur:
         cur.execute("SELECT to_regclass('public.plano_pagamento_cliente');")
         if cur.fetchone()[0] is None:
@@ -2116,6 +2967,7 @@ def _ensure_plano_pagamentos_schema() -> None:
                 UNIQUE (cliente_codigo, loja_codigo, plano_codigo);
                 """
             )
+    _plano_pagamentos_schema_ok = True
 
 def _normalize_plano(item: PlanoPagamentoClienteIn) -> PlanoPagamentoClienteIn:
     if item.PLANUMPAR is None:
@@ -2201,9 +3053,7 @@ async def listar_planos_pagamento_cliente(
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    await run_in_threadpool(_ensure_plano_pagamentos_schema)
-    plans = await run_in_threadpool(_fetch_planos_pagamento, cliente_codigo, loja_codigo)
-    data = [_plan_to_dict(plan) for plan in plans]
+    data = await _run_orm_read(_listar_planos_pagamento, cliente_codigo, loja_codigo)
     return {"cliente_codigo": cliente_codigo, "total": len(data), "data": data}
 
 
@@ -2213,9 +3063,7 @@ async def listar_planos_pagamento_cliente_path(
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    await run_in_threadpool(_ensure_plano_pagamentos_schema)
-    plans = await run_in_threadpool(_fetch_planos_pagamento, cliente_codigo, loja_codigo)
-    data = [_plan_to_dict(plan) for plan in plans]
+    data = await _run_orm_read(_listar_planos_pagamento, cliente_codigo, loja_codigo)
     return {"cliente_codigo": cliente_codigo, "total": len(data), "data": data}
 
 
@@ -2232,6 +3080,9 @@ async def sync_planos_pagamento_clientes(
 # LOJAS (Postgres)
 # -----------------------------------
 def _sync_lojas(payload: List[LojaIn]) -> int:
+    # Fica no ORM de propósito: erp_lojas é lida pelo Django (listar_lojas/detalhar_loja)
+    # e o banco do Django pode não ser o mesmo do pool de dados (DATA_POSTGRES_*).
+    # batch_size limita o número de parâmetros por INSERT ... ON CONFLICT em cargas grandes.
     now = dj_timezone.now()
     lojas = [
         Loja(
@@ -2261,24 +3112,8 @@ def _sync_lojas(payload: List[LojaIn]) -> int:
         lojas,
         update_conflicts=True,
         unique_fields=["codigo"],
-        update_fields=[
-            "razao_social",
-            "nome_fantasia",
-            "cnpj_cpf",
-            "ie_rg",
-            "tipo_pf_pj",
-            "telefone1",
-            "telefone2",
-            "endereco",
-            "bairro",
-            "numero",
-            "complemento",
-            "cep",
-            "email",
-            "cidade",
-            "estado",
-            "updated_at",
-        ],
+        update_fields=_LOJA_UPDATE_FIELDS,
+        batch_size=LOJA_SYNC_BATCH_SIZE,
     )
     return len(lojas)
 
@@ -2286,26 +3121,37 @@ def _sync_lojas(payload: List[LojaIn]) -> int:
 @app.get("/api/lojas", tags=["lojas"])
 async def listar_lojas(
     q: Optional[str] = None,
+    after: Optional[str] = Query(None, description="Último código recebido (paginação por chave)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
+    # Sem after/limit mantém a resposta antiga (lista completa) para os clientes
+    # atuais; com qualquer um dos dois pagina por codigo e devolve {items, next}.
+    paginated = after is not None or limit is not None
+    page_size = limit or 100
+
     def _fetch():
         codigo_regex = _loja_regex(loja_codigo)
         qs = Loja.objects.filter(codigo__regex=codigo_regex).order_by("codigo")
         if q:
-            return list(
-                qs.filter(
-                    models.Q(codigo__icontains=q)
-                    | models.Q(razao_social__icontains=q)
-                    | models.Q(nome_fantasia__icontains=q)
-                    | models.Q(cidade__icontains=q)
-                    | models.Q(estado__icontains=q)
-                )
+            qs = qs.filter(
+                models.Q(codigo__icontains=q)
+                | models.Q(razao_social__icontains=q)
+                | models.Q(nome_fantasia__icontains=q)
+                | models.Q(cidade__icontains=q)
+                | models.Q(estado__icontains=q)
             )
-        return list(qs)
+        if not paginated:
+            # Serializa na própria thread: o event loop só repassa os bytes.
+            return _json_bytes([_loja_to_dict(loja) for loja in qs.values(*_LOJA_VALUES_FIELDS)])
+        if after:
+            qs = qs.filter(codigo__gt=after)
+        items = [_loja_to_dict(loja) for loja in qs.values(*_LOJA_VALUES_FIELDS)[:page_size]]
+        next_after = items[-1]["LOJCOD"] if len(items) == page_size else None
+        return _json_bytes({"items": items, "next": next_after})
 
-    lojas = await run_in_threadpool(_fetch)
-    return [_loja_to_dict(loja) for loja in lojas]
+    return _json_bytes_response(await _run_orm_read(_fetch))
 
 
 @app.get("/api/lojas/{loja_codigo}", tags=["lojas"])
@@ -2317,7 +3163,9 @@ async def detalhar_loja(
     if not _loja_matches(loja_codigo, loja_tenant):
         raise HTTPException(403, "Loja não autorizada")
     codigo_regex = _loja_regex(loja_codigo)
-    loja = await run_in_threadpool(lambda: Loja.objects.filter(codigo__regex=codigo_regex).first())
+    loja = await _run_orm_read(
+        lambda: Loja.objects.filter(codigo__regex=codigo_regex).values(*_LOJA_VALUES_FIELDS).first()
+    )
     if not loja:
         raise HTTPException(404, "Loja não encontrada")
     return _loja_to_dict(loja)
@@ -2361,7 +3209,17 @@ async def api_me(
 # -----------------------------------
 # SEFAZ CONFIG (Postgres)
 # -----------------------------------
-def _handle_sefaz_submit(data: dict, files: dict) -> dict:
+def _handle_sefaz_submit(data: dict, certificate: Optional[tuple[str, str]] = None) -> dict:
+    # O certificado chega ainda em base64 ((nome, conteúdo)) e é decodificado aqui,
+    # na thread, para não travar o event loop com arquivos PFX grandes.
+    files = {}
+    if certificate:
+        filename, content_b64 = certificate
+        try:
+            content = base64.b64decode(content_b64)
+        except Exception:
+            return {"errors": {"certificate_file_b64": ["Arquivo inválido (base64)."]}}
+        files["certificate_file"] = SimpleUploadedFile(filename, content)
     config = SefazConfiguration.load()
     form = SefazConfigurationForm(data, files, instance=config)
     if form.is_valid():
@@ -2372,10 +3230,26 @@ def _handle_sefaz_submit(data: dict, files: dict) -> dict:
     return {"errors": form.errors}
 
 
+# (válido até, config serializada). Atualizado no PUT/PATCH deste processo; o TTL
+# cobre alterações feitas pelo Django (admin/telas) ou por outros workers.
+_sefaz_config_cache: Optional[tuple[float, dict]] = None
+
+
+def _load_sefaz_config_data() -> dict:
+    return _serialize_sefaz_config(SefazConfiguration.load())
+
+
 @app.get("/api/sefaz/config", tags=["sefaz"])
 async def get_sefaz_config(token: dict = Depends(require_jwt)):
-    cfg = await run_in_threadpool(SefazConfiguration.load)
-    return _serialize_sefaz_config(cfg)
+    global _sefaz_config_cache
+    now = time.time()
+    cached = _sefaz_config_cache
+    if cached and cached[0] > now:
+        return cached[1]
+    data = await _run_orm_read(_load_sefaz_config_data)
+    if SEFAZ_CONFIG_CACHE_TTL > 0:
+        _sefaz_config_cache = (now + SEFAZ_CONFIG_CACHE_TTL, data)
+    return data
 
 
 @app.put("/api/sefaz/config", tags=["sefaz"])
@@ -2392,18 +3266,16 @@ async def update_sefaz_config(
         "certificate_password": (payload.certificate_password or "").strip(),
         "clear_certificate": bool(payload.clear_certificate),
     }
-    files = {}
+    certificate = None
     if payload.certificate_file_b64:
-        filename = payload.certificate_filename or "certificate.pfx"
-        try:
-            content = base64.b64decode(payload.certificate_file_b64)
-        except Exception:
-            return JSONResponse({"certificate_file_b64": ["Arquivo inválido (base64)."]}, status_code=400)
-        files["certificate_file"] = SimpleUploadedFile(filename, content)
+        certificate = (payload.certificate_filename or "certificate.pfx", payload.certificate_file_b64)
 
-    result = await run_in_threadpool(_handle_sefaz_submit, data, files)
+    global _sefaz_config_cache
+    result = await run_in_threadpool(_handle_sefaz_submit, data, certificate)
     if "errors" in result:
         return JSONResponse(result["errors"], status_code=400)
+    if SEFAZ_CONFIG_CACHE_TTL > 0:
+        _sefaz_config_cache = (time.time() + SEFAZ_CONFIG_CACHE_TTL, result["data"])
     return result["data"]
 
 
@@ -2420,7 +3292,10 @@ async def company_nfe(
     token: dict = Depends(require_jwt),
 ):
     def _run_query():
-        company = Company.objects.get(pk=pk)
+        # Só os campos usados na consulta (CNPJ, UF) e na resposta.
+        company = Company.objects.filter(pk=pk).only("pk", "name", "tax_id", "state").first()
+        if company is None:
+            return {"status": 404, "payload": {"message": "Empresa não encontrada"}}
         params = {
             "last_nsu": last_nsu,
             "nsu": nsu,
@@ -2457,21 +3332,44 @@ async def company_nfe(
 
 
 async def _login(payload: LoginRequest, loja_codigo: str) -> dict:
-    user = await _get_user_by_credentials(payload.username.strip(), payload.password)
+    # api_users (banco de auth) e erp_clientes_vendedores (banco de dados) são
+    # independentes: a busca do vendedor pelo nome corre junto com a leitura do
+    # usuário, e a busca pelo vendor_code corre junto com a conferência da senha
+    # (hash em thread). O vendedor por nome só é usado como fallback.
+    invalid = HTTPException(401, "Usuário ou senha inválidos", headers={"WWW-Authenticate": "Bearer"})
+    user, vendor_by_name = await asyncio.gather(
+        _get_active_user_for_login(payload.username),
+        _resolve_vendor_for_username(payload.username, loja_codigo),
+        return_exceptions=True,
+    )
+    if isinstance(user, BaseException):
+        raise user
     if not user:
-        raise HTTPException(401, "Usuário ou senha inválidos", headers={"WWW-Authenticate": "Bearer"})
-    vendor = await _resolve_vendor_by_code(user.get("vendor_code"), loja_codigo)
+        raise invalid
+    password_ok, vendor = await asyncio.gather(
+        _run_password_hash(_verify_password, payload.password, user["password_hash"]),
+        _resolve_vendor_by_code(user.get("vendor_code"), loja_codigo),
+        return_exceptions=True,
+    )
+    if isinstance(password_ok, BaseException):
+        raise password_ok
+    if not password_ok:
+        raise invalid
+    if isinstance(vendor, BaseException):
+        raise vendor
     # Fallback por nome apenas se não houver vendor_code cadastrado
     if not vendor:
-        vendor = await _resolve_vendor_for_username(payload.username, loja_codigo)
+        if isinstance(vendor_by_name, BaseException):
+            raise vendor_by_name
+        vendor = vendor_by_name
     vendor_code = vendor.get("vendor_code") if vendor else None
     token = _create_access_token(user["id"], user["username"], vendor_code)
     user_data = {
         "id": user["id"],
         "username": user["username"],
         "is_active": True,
-        "created_at": dj_timezone.now(),
-        "updated_at": dj_timezone.now(),
+        "created_at": user["created_at"],
+        "updated_at": user["updated_at"],
         "vendor_code": vendor.get("vendor_code") if vendor else None,
         "vendor_name": vendor.get("vendor_name") if vendor else None,
     }
@@ -2513,7 +3411,7 @@ async def create_user(
     if not payload.password:
         raise HTTPException(400, "Senha inválida")
 
-    password_hash = _hash_password(payload.password)
+    password_hash = await _run_password_hash(_hash_password, payload.password)
     pool = _get_auth_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
@@ -2569,39 +3467,46 @@ def _resolve_cliente(cliente_id: str, loja_codigo: Optional[str] = None) -> Clie
     if client_code == "0":
         return Client.get_default_consumer()
 
-    def find_client(code: str) -> Optional[Client]:
-        if not code:
+    def find_client(*codes: Optional[str]) -> Optional[Client]:
+        """Uma consulta para todos os códigos; vence o primeiro, PK antes de código interno."""
+        codes = [code for code in dict.fromkeys(codes) if code]
+        if not codes:
             return None
-        candidate = None
-        if code.isdigit():
-            try:
-                candidate = Client.objects.filter(pk=int(code)).first()
-            except Exception:
-                candidate = None
-        if not candidate:
-            candidate = Client.objects.filter(code=code).first()
-        return candidate
+        # CPF/CNPJ numéricos passam do limite da PK e quebrariam a consulta.
+        # isascii: isdigit() também aceita dígitos Unicode ("²") que int() rejeita.
+        _, max_pk = connection.ops.integer_field_range(Client._meta.pk.get_internal_type())
+        pk_by_code = {code: int(code) for code in codes if code.isascii() and code.isdigit()}
+        pks = {pk for pk in pk_by_code.values() if max_pk is None or pk <= max_pk}
+        matches = list(Client.objects.filter(models.Q(code__in=codes) | models.Q(pk__in=pks)))
+        by_pk = {c.pk: c for c in matches}
+        by_code = {c.code: c for c in matches}
+        for code in codes:
+            cliente = by_pk.get(pk_by_code.get(code)) or by_code.get(code)
+            if cliente:
+                return cliente
+        return None
 
     # 1) Busca direta por PK ou código interno informado
     cliente = find_client(client_code)
     if cliente:
         return cliente
 
-    # 2) Fallback: tentar resolver pelo staging de clientes sincronizados (ERP)
-    sync_qs = ClienteSync.objects.filter(cliente_codigo=client_code)
+    # 2) Fallback: tentar resolver pelo staging de clientes sincronizados (ERP),
+    # pelo código informado ou, se numérico, sem os zeros à esquerda.
+    sync_codes = [client_code]
+    if client_code.isdigit() and client_code.lstrip("0"):
+        sync_codes.append(client_code.lstrip("0"))
+    sync_qs = ClienteSync.objects.filter(cliente_codigo__in=sync_codes)
     if loja_codigo:
         sync_qs = sync_qs.filter(loja_codigo=loja_codigo)
-    sync_entry = sync_qs.first()
-    if not sync_entry and client_code.isdigit():
-        stripped = client_code.lstrip("0")
-        if stripped:
-            sync_qs = ClienteSync.objects.filter(cliente_codigo=stripped)
-            if loja_codigo:
-                sync_qs = sync_qs.filter(loja_codigo=loja_codigo)
-            sync_entry = sync_qs.first()
+    sync_entries = list(sync_qs)
+    sync_entry = next(
+        (entry for code in sync_codes for entry in sync_entries if entry.cliente_codigo == code),
+        None,
+    )
 
     if sync_entry:
-        doc_digits = "".join(ch for ch in (sync_entry.cliente_cnpj_cpf or "") if ch.isdigit())
+        doc_digits = _only_digits(sync_entry.cliente_cnpj_cpf or "")
         code_candidates = [
             doc_digits,
             sync_entry.cliente_codigo,
@@ -2609,10 +3514,9 @@ def _resolve_cliente(cliente_id: str, loja_codigo: Optional[str] = None) -> Clie
         ]
 
         # 2a) Tenta encontrar por código/documento
-        for candidate_code in code_candidates:
-            cliente = find_client(candidate_code or "")
-            if cliente:
-                return cliente
+        cliente = find_client(*code_candidates)
+        if cliente:
+            return cliente
 
         # 2b) Se não existe em Client, cria um registro básico a partir do staging
         new_code = next((c for c in code_candidates if c), client_code)
@@ -2642,89 +3546,172 @@ def _resolve_cliente(cliente_id: str, loja_codigo: Optional[str] = None) -> Clie
     raise HTTPException(400, f"Cliente não encontrado: {cliente_id}")
 
 
-def _resolve_produto(codigo_produto: str) -> Product:
-    raw = (codigo_produto or "").strip()
+# Pedidos repetem muito os mesmos códigos: os candidatos ficam em cache por valor.
+@functools.lru_cache(maxsize=4096)
+def _plu_candidates(value: str) -> tuple[str, ...]:
+    """PLU como veio, só os dígitos e os dígitos sem zeros à esquerda."""
+    digits = _only_digits(value)
+    stripped = digits.lstrip("0") or ("0" if digits else None)
+    candidates = [value]
+    for candidate in (digits, stripped):
+        if candidate and candidate not in candidates:
+            candidates.append(candidate)
+    return tuple(candidates)
+
+
+@functools.lru_cache(maxsize=4096)
+def _code_candidates(raw: str) -> tuple[Optional[str], tuple[str, ...]]:
+    """Código normalizado (Product.normalize_code) e as variações buscadas em erp_produtos_sync."""
     normalized = Product.normalize_code(raw)
-    produto = None
+    if not normalized:
+        return normalized, ()
+    candidates = {raw, normalized}
+    digits = _only_digits(normalized)
+    if digits:
+        candidates.add(digits)
+        candidates.add(digits.lstrip("0") or "0")
+    return normalized, tuple(c for c in candidates if c)
+
+
+def _resolve_produtos(codigos: List[str]) -> dict:
+    """Resolve vários códigos/PLUs de itens de pedido com duas consultas no total.
 
+    Segue, para cada código, a mesma ordem de tentativas que era feita item a
+    item: PLU em Product; PLU em erp_produtos_sync -> código do Product; código
+    em erp_produtos_sync -> PLU/código do Product; PK numérico; código interno.
+    Códigos não resolvidos ficam de fora do dicionário devolvido.
+    """
     # ProdutoSync nao expõe timestamp em algumas bases; escolhemos um fallback seguro.
     produto_sync_ordering = "-updated_at"
     if not any(field.name == "updated_at" for field in ProdutoSync._meta.fields):
         produto_sync_ordering = "-codigo"
 
-    # 1) PLU (ERP Studio envia índice PLU). Tentamos:
-    #    a) match direto em Product.plu_code (raw, só dígitos, sem zeros à esquerda)
-    #    b) fallback via tabela erp_produtos_sync para descobrir o código e então localizar Product
-    if raw:
-        digits = "".join(ch for ch in raw if ch.isdigit())
-        stripped = digits.lstrip("0") or ("0" if digits else None)
-        plu_candidates = [raw]
-        if digits and digits not in plu_candidates:
-            plu_candidates.append(digits)
-        if stripped and stripped not in plu_candidates:
-            plu_candidates.append(stripped)
-
-        produto = Product.objects.filter(plu_code__in=plu_candidates).first()
-        if not produto:
-            psync = ProdutoSync.objects.filter(plu__in=plu_candidates).order_by(produto_sync_ordering).first()
-            if psync and psync.codigo:
-                code_from_sync = str(psync.codigo).strip()
-                norm_code = Product.normalize_code(code_from_sync)
-                code_candidates = [c for c in {code_from_sync, norm_code} if c]
-                produto = Product.objects.filter(code__in=code_candidates).first()
-                if not produto:
-                    numeric = norm_code if norm_code and norm_code.isdigit() else None
-                    if numeric:
-                        try:
-                            produto = Product.objects.filter(pk=int(numeric)).first()
-                        except Exception:
-                            produto = None
+    plans = {}
+    for codigo in dict.fromkeys(codigos):
+        raw = (codigo or "").strip()
+        normalized, code_candidates = _code_candidates(raw)
+        plans[codigo] = (raw, normalized, _plu_candidates(raw) if raw else (), code_candidates)
+
+    # 1) erp_produtos_sync: uma consulta para todos os PLUs e códigos candidatos.
+    sync_plus = {c for plan in plans.values() for c in plan[2]}
+    sync_codigos = {c for plan in plans.values() for c in plan[3]}
+    sync_by_plu: dict = {}
+    sync_by_codigo: dict = {}
+    if sync_plus or sync_codigos:
+        syncs = ProdutoSync.objects.filter(
+            models.Q(plu__in=sync_plus) | models.Q(codigo__in=sync_codigos)
+        ).order_by(produto_sync_ordering)
+        for rank, psync in enumerate(syncs):
+            if psync.plu in sync_plus:
+                sync_by_plu.setdefault(psync.plu, (rank, psync))
+            if psync.codigo in sync_codigos:
+                sync_by_codigo.setdefault(psync.codigo, (rank, psync))
+
+    def first_ranked(index: dict, keys: list):
+        matches = [index[key] for key in keys if key in index]
+        return min(matches, key=lambda match: match[0])[1] if matches else None
+
+    def sync_code_keys(psync) -> tuple[list, Optional[str]]:
+        code_from_sync = str(psync.codigo).strip()
+        norm_code = Product.normalize_code(code_from_sync)
+        return [c for c in {code_from_sync, norm_code} if c], norm_code
+
+    # 2) Product: uma consulta com todas as chaves que algum caminho pode usar.
+    plu_keys, code_keys, pk_keys = set(), set(), set()
+    for raw, normalized, plu_candidates, code_candidates in plans.values():
+        plu_keys.update(plu_candidates)
+        for psync in (first_ranked(sync_by_plu, plu_candidates), first_ranked(sync_by_codigo, code_candidates)):
+            if not psync:
+                continue
+            if psync.plu and str(psync.plu).strip():
+                plu_keys.update(_plu_candidates(str(psync.plu).strip()))
+            if psync.codigo:
+                keys, norm_code = sync_code_keys(psync)
+                code_keys.update(keys)
+                if norm_code and norm_code.isdigit():
+                    pk_keys.add(int(norm_code))
+        if normalized:
+            code_keys.add(normalized)
+            if normalized.isdigit():
+                pk_keys.add(int(normalized))
+
+    # plu_code e code não são únicos: a posição na ordenação padrão de Product
+    # decide entre duplicados, como o .first() de cada consulta fazia.
+    by_plu: dict = {}
+    by_code: dict = {}
+    by_pk: dict = {}
+    if plu_keys or code_keys or pk_keys:
+        produtos = Product.objects.filter(
+            models.Q(plu_code__in=plu_keys) | models.Q(code__in=code_keys) | models.Q(pk__in=pk_keys)
+        )
+        for rank, produto in enumerate(produtos):
+            by_pk[produto.pk] = produto
+            if produto.plu_code in plu_keys:
+                by_plu.setdefault(produto.plu_code, (rank, produto))
+            if produto.code in code_keys:
+                by_code.setdefault(produto.code, (rank, produto))
+
+    def from_sync_code(psync):
+        keys, norm_code = sync_code_keys(psync)
+        produto = first_ranked(by_code, keys)
+        if not produto and norm_code and norm_code.isdigit():
+            produto = by_pk.get(int(norm_code))
+        return produto
+
+    resolved = {}
+    for codigo, (raw, normalized, plu_candidates, code_candidates) in plans.items():
+        produto = None
+        # PLU (ERP Studio envia índice PLU): direto em Product ou via erp_produtos_sync.
+        if raw:
+            produto = first_ranked(by_plu, plu_candidates)
+            if not produto:
+                psync = first_ranked(sync_by_plu, plu_candidates)
+                if psync and psync.codigo:
+                    produto = from_sync_code(psync)
+        # Código (e não PLU): mapeia via erp_produtos_sync, depois PK e código interno.
+        if not produto and normalized:
+            psync = first_ranked(sync_by_codigo, code_candidates)
+            if psync:
+                plu_from_sync = str(psync.plu).strip() if psync.plu else None
+                if plu_from_sync:
+                    produto = first_ranked(by_plu, _plu_candidates(plu_from_sync))
+                if not produto and psync.codigo:
+                    produto = from_sync_code(psync)
+            if not produto and normalized.isdigit():
+                produto = by_pk.get(int(normalized))
+            if not produto:
+                produto = first_ranked(by_code, [normalized])
         if produto:
-            return produto
-
-    # 1b) Se veio código (e não PLU), tente mapear via tabela de sync (codigo -> produto)
-    if not produto and normalized:
-        code_candidates = {raw, normalized}
-        digits = "".join(ch for ch in normalized if ch.isdigit())
-        if digits:
-            code_candidates.add(digits)
-            stripped = digits.lstrip("0") or "0"
-            code_candidates.add(stripped)
-
-        psync = ProdutoSync.objects.filter(codigo__in=[c for c in code_candidates if c]).order_by(produto_sync_ordering).first()
-        if psync:
-            # Se a sync tem PLU, reaproveita a lógica acima
-            plu_from_sync = str(psync.plu).strip() if psync.plu else None
-            if plu_from_sync:
-                plu_digits = "".join(ch for ch in plu_from_sync if ch.isdigit())
-                plu_stripped = plu_digits.lstrip("0") or ("0" if plu_digits else None)
-                plu_candidates = [plu_from_sync]
-                for cand in (plu_digits, plu_stripped):
-                    if cand and cand not in plu_candidates:
-                        plu_candidates.append(cand)
-                produto = Product.objects.filter(plu_code__in=plu_candidates).first()
-            if not produto and psync.codigo:
-                code_from_sync = str(psync.codigo).strip()
-                norm_code = Product.normalize_code(code_from_sync)
-                code_lookup = [c for c in {code_from_sync, norm_code} if c]
-                produto = Product.objects.filter(code__in=code_lookup).first()
-                if not produto and norm_code and norm_code.isdigit():
-                    try:
-                        produto = Product.objects.filter(pk=int(norm_code)).first()
-                    except Exception:
-                        produto = None
-            if produto:
-                return produto
-
-    # 2) PK numérico
-    if not produto and normalized and normalized.isdigit():
-        produto = Product.objects.filter(pk=int(normalized)).first()
-    # 3) Código interno
-    if not produto and normalized:
-        produto = Product.objects.filter(code=normalized).first()
-    if not produto:
-        raise HTTPException(400, f"Produto não encontrado: {codigo_produto}")
-    return produto
+            resolved[codigo] = produto
+    return resolved
+
+
+_DECIMAL_ZERO = Decimal("0")
+# Diferença máxima aceita entre o total enviado e a soma dos itens.
+_TOTAL_TOLERANCE = Decimal("0.01")
+
+
+def _canonical_decimal(value) -> str:
+    return format(Decimal(value).normalize(), "f")
+
+
+def _pedido_idempotency_key(cliente, payload: PedidoIn, loja_codigo: str, itens_resolvidos) -> str:
+    """SHA-256 do conteúdo do pedido (cliente, data, total, loja e itens ordenados)."""
+    itens = sorted(
+        (prod.pk, _canonical_decimal(quant), _canonical_decimal(valor))
+        for (prod, quant, valor) in itens_resolvidos
+    )
+    canonical = json.dumps(
+        [
+            cliente.pk,
+            payload.data_criacao.isoformat(),
+            _canonical_decimal(payload.total),
+            loja_codigo or "",
+            itens,
+        ],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
 
 def _create_pedido_sync(
@@ -2739,16 +3726,17 @@ def _create_pedido_sync(
 
         cliente = _resolve_cliente(payload.cliente_id, loja_codigo)
 
-        itens_resolvidos = []
-        total_calculado = Decimal("0")
-        for item in itens_payload:
-            produto = _resolve_produto(item.codigo_produto)
-            quantidade = Decimal(item.quantidade)
-            valor_unitario = Decimal(item.valor_unitario)
-            total_calculado += quantidade * valor_unitario
-            itens_resolvidos.append((produto, quantidade, valor_unitario))
+        produtos = _resolve_produtos([item.codigo_produto for item in itens_payload])
+        faltando = next((item.codigo_produto for item in itens_payload if item.codigo_produto not in produtos), None)
+        if faltando is not None:
+            raise HTTPException(400, f"Produto não encontrado: {faltando}")
+        # PedidoItemIn já entrega Decimal (o pydantic converte a partir do texto do JSON).
+        itens_resolvidos = [
+            (produtos[item.codigo_produto], item.quantidade, item.valor_unitario) for item in itens_payload
+        ]
 
-        if abs(total_calculado - Decimal(payload.total)) > Decimal("0.01"):
+        total_calculado = sum((quant * valor for _, quant, valor in itens_resolvidos), _DECIMAL_ZERO)
+        if abs(total_calculado - payload.total) > _TOTAL_TOLERANCE:
             raise HTTPException(
                 400,
                 f"Total inconsistente: recebido {payload.total}, calculado {total_calculado}",
@@ -2783,89 +3771,125 @@ def _create_pedido_sync(
             if match:
                 vendedor_nome = match.vendedor_nome or vendedor_nome
 
-        # Idempotência: evita duplicar se já recebemos o mesmo pedido recentemente.
-        window_start = dj_timezone.now() - timedelta(minutes=10)
-        existente = (
-            Pedido.objects.filter(
-                cliente=cliente,
-                data_criacao=payload.data_criacao,
-                total=payload.total,
-                data_recebimento__gte=window_start,
-            )
-            .order_by("-id")
-            .first()
-        )
-        if existente:
-            return existente, False
+        idempotency_key = _pedido_idempotency_key(cliente, payload, loja_codigo, itens_resolvidos)
 
         loja_field = _get_pedido_loja_field()
         if not loja_field:
             raise HTTPException(500, "Modelo Pedido sem loja_codigo")
 
-        with transaction.atomic():
-            pedido_kwargs = {
-                "data_criacao": payload.data_criacao,
-                "total": payload.total,
-                "cliente": cliente,
-                "status": status_val,
-                "pagamento_status": pagamento_status,
-                "forma_pagamento": forma_pagamento,
-                "frete_modalidade": frete_modalidade,
-                "vendedor_codigo": vendedor_codigo,
-                "vendedor_nome": vendedor_nome,
-                loja_field: loja_codigo,
-            }
-            pedido = Pedido.objects.create(**pedido_kwargs)
-            ItemPedido.objects.bulk_create(
-                [
-                    ItemPedido(
-                        pedido=pedido,
-                        produto=prod,
-                        quantidade=quant,
-                        valor_unitario=valor,
-                        loja_codigo=loja_codigo,
-                    )
-                    for (prod, quant, valor) in itens_resolvidos
-                ]
-            )
+        pedido_kwargs = {
+            "data_criacao": payload.data_criacao,
+            "total": payload.total,
+            "cliente": cliente,
+            "status": status_val,
+            "pagamento_status": pagamento_status,
+            "forma_pagamento": forma_pagamento,
+            "frete_modalidade": frete_modalidade,
+            "vendedor_codigo": vendedor_codigo,
+            "vendedor_nome": vendedor_nome,
+            loja_field: loja_codigo,
+            "idempotency_key": idempotency_key,
+        }
+        # Idempotência: a chave é UNIQUE no banco, então o próprio INSERT detecta o
+        # reenvio (inclusive concorrente) com uma sonda no índice.
+        try:
+            with transaction.atomic():
+                pedido = Pedido.objects.create(**pedido_kwargs)
+                ItemPedido.objects.bulk_create(
+                    [
+                        ItemPedido(
+                            pedido=pedido,
+                            produto=prod,
+                            quantidade=quant,
+                            valor_unitario=valor,
+                            loja_codigo=loja_codigo,
+                        )
+                        for (prod, quant, valor) in itens_resolvidos
+                    ],
+                    batch_size=PEDIDO_ITENS_BATCH_SIZE,
+                )
+        except IntegrityError:
+            existente = Pedido.objects.filter(idempotency_key=idempotency_key).first()
+            if existente is None:
+                raise
+            return existente, False
         return pedido, True
     except Exception:
         logger.exception("Erro ao criar pedido via API (payload capturado)")
         raise
 
 
-def _pedido_to_dict(pedido: Pedido):
-    itens_out = []
-    for item in pedido.itens.all():
-        qty = item.quantidade or Decimal("0")
-        unit = item.valor_unitario or Decimal("0")
-        itens_out.append(
+def _pedido_itens_por_pedido(pedido_ids: List[int]) -> dict[int, list]:
+    """Itens dos pedidos informados, já no formato da resposta, agrupados por pedido."""
+    itens: dict[int, list] = {pedido_id: [] for pedido_id in pedido_ids}
+    rows = (
+        ItemPedido.objects.filter(pedido_id__in=pedido_ids)
+        .order_by("pk")
+        .values_list("pedido_id", "produto_id", "produto__code", "produto__name", "quantidade", "valor_unitario")
+    )
+    for pedido_id, produto_id, code, name, qty, unit in rows:
+        qty = qty or _DECIMAL_ZERO
+        unit = unit or _DECIMAL_ZERO
+        itens[pedido_id].append(
             {
-                "produto_id": item.produto_id,
-                "produto_codigo": item.produto.code if hasattr(item.produto, "code") else None,
-                "produto_nome": getattr(item.produto, "name", None) or str(item.produto),
+                "produto_id": produto_id,
+                "produto_codigo": code,
+                # Mesmo fallback de str(Product) quando o produto não tem nome.
+                "produto_nome": name or f"{name} ({code or '—'})",
                 "quantidade": float(qty),
                 "valor_unitario": float(unit),
                 "subtotal": float(qty * unit),
             }
         )
-
+    return itens
+
+
+# Colunas de Pedido (e do cliente, para o nome) lidas pelas listagens/detalhe.
+_PEDIDO_VALUES_FIELDS = (
+    "id",
+    "cliente_id",
+    "cliente__code",
+    "cliente__first_name",
+    "cliente__last_name",
+    "cliente__email",
+    "data_criacao",
+    "data_recebimento",
+    "total",
+    "status",
+    "pagamento_status",
+    "forma_pagamento",
+    "frete_modalidade",
+    "vendedor_codigo",
+    "vendedor_nome",
+)
+_PEDIDO_STATUS_LABELS = dict(Pedido.Status.choices)
+_PEDIDO_PAGAMENTO_LABELS = dict(Pedido.PaymentStatus.choices)
+_PEDIDO_FRETE_LABELS = dict(Pedido.FreightMode.choices)
+
+
+def _pedido_to_dict(pedido: dict, itens_out: list):
+    """Monta a resposta a partir de uma linha de ``.values(*_PEDIDO_VALUES_FIELDS)``."""
+    # Mesmo texto de str(Client) e dos get_*_display() do modelo, sem instanciá-lo.
+    cliente_display = f"{pedido['cliente__first_name']} {pedido['cliente__last_name']}".strip()
+    status = pedido["status"]
+    pagamento_status = pedido["pagamento_status"]
+    frete_modalidade = pedido["frete_modalidade"]
     return {
-        "id": pedido.id,
-        "cliente_id": pedido.cliente_id,
-        "cliente_nome": str(pedido.cliente),
-        "data_criacao": pedido.data_criacao,
-        "data_recebimento": pedido.data_recebimento,
-        "total": float(pedido.total),
-        "status": pedido.status,
-        "status_display": pedido.get_status_display(),
-        "pagamento_status": pedido.pagamento_status,
-        "pagamento_status_display": pedido.get_pagamento_status_display(),
-        "forma_pagamento": pedido.forma_pagamento,
-        "frete_modalidade": pedido.frete_modalidade,
-        "frete_modalidade_display": pedido.get_frete_modalidade_display(),
-        "vendedor_codigo": pedido.vendedor_codigo,
-        "vendedor_nome": pedido.vendedor_nome,
+        "id": pedido["id"],
+        "cliente_id": pedido["cliente_id"],
+        "cliente_nome": f"{pedido['cliente__code']} - {cliente_display or pedido['cliente__email']}",
+        "data_criacao": pedido["data_criacao"],
+        "data_recebimento": pedido["data_recebimento"],
+        "total": float(pedido["total"]),
+        "status": status,
+        "status_display": str(_PEDIDO_STATUS_LABELS.get(status, status)),
+        "pagamento_status": pagamento_status,
+        "pagamento_status_display": str(_PEDIDO_PAGAMENTO_LABELS.get(pagamento_status, pagamento_status)),
+        "forma_pagamento": pedido["forma_pagamento"],
+        "frete_modalidade": frete_modalidade,
+        "frete_modalidade_display": str(_PEDIDO_FRETE_LABELS.get(frete_modalidade, frete_modalidade)),
+        "vendedor_codigo": pedido["vendedor_codigo"],
+        "vendedor_nome": pedido["vendedor_nome"],
         "itens": itens_out,
     }
 
@@ -2886,7 +3910,7 @@ def _listar_pedidos_sync(
     loja_field = _get_pedido_loja_field()
     if not loja_field:
         raise HTTPException(500, "Modelo Pedido sem loja_codigo")
-    qs = Pedido.objects.select_related("cliente").prefetch_related("itens__produto").order_by("-data_recebimento")
+    qs = Pedido.objects.order_by("-data_recebimento")
     qs = qs.filter(**{loja_field: loja_codigo})
     if cliente_id:
         try:
@@ -2896,7 +3920,24 @@ def _listar_pedidos_sync(
             qs = qs.none()
     if status:
         qs = qs.filter(status=status)
-    return [_pedido_to_dict(p) for p in qs[:limit]]
+    pedidos = list(qs.values(*_PEDIDO_VALUES_FIELDS)[:limit])
+    itens = _pedido_itens_por_pedido([p["id"] for p in pedidos])
+    return [_pedido_to_dict(p, itens[p["id"]]) for p in pedidos]
+
+
+def _listar_pedidos_json(
+    limit: int,
+    cliente_id: Optional[str],
+    status: Optional[str],
+    loja_codigo: str,
+) -> bytes:
+    # Listagens podem ter centenas de pedidos: o JSON sai pronto da thread,
+    # sem jsonable_encoder nem serialização no event loop.
+    return _json_bytes(_listar_pedidos_sync(limit, cliente_id, status, loja_codigo))
+
+
+def _get_pedido_json(pedido_id: int, loja_codigo: str) -> bytes:
+    return _json_bytes(_get_pedido_sync(pedido_id, loja_codigo))
 
 
 def _get_pedido_sync(pedido_id: int, loja_codigo: str):
@@ -2904,14 +3945,13 @@ def _get_pedido_sync(pedido_id: int, loja_codigo: str):
     if not loja_field:
         raise HTTPException(500, "Modelo Pedido sem loja_codigo")
     pedido = (
-        Pedido.objects.select_related("cliente")
-        .prefetch_related("itens__produto")
-        .filter(pk=pedido_id, **{loja_field: loja_codigo})
+        Pedido.objects.filter(pk=pedido_id, **{loja_field: loja_codigo})
+        .values(*_PEDIDO_VALUES_FIELDS)
         .first()
     )
     if not pedido:
         raise HTTPException(404, "Pedido não encontrado")
-    return _pedido_to_dict(pedido)
+    return _pedido_to_dict(pedido, _pedido_itens_por_pedido([pedido["id"]])[pedido["id"]])
 
 
 @router.post("/pedidos", tags=["pedidos"])
@@ -2954,7 +3994,9 @@ async def listar_pedidos(
 ):
     if status and status not in PEDIDO_STATUS_VALUES:
         raise HTTPException(400, f"Status inválido. Opções: {sorted(PEDIDO_STATUS_VALUES)}")
-    return await run_in_threadpool(_listar_pedidos_sync, limit, cliente_id, status, loja_codigo)
+    return _json_bytes_response(
+        await _run_orm_read(_listar_pedidos_json, limit, cliente_id, status, loja_codigo)
+    )
 
 
 @router.get("/pedidos/{pedido_id}", tags=["pedidos"])
@@ -2963,7 +4005,7 @@ async def detalhar_pedido(
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    return await run_in_threadpool(_get_pedido_sync, pedido_id, loja_codigo)
+    return _json_bytes_response(await _run_orm_read(_get_pedido_json, pedido_id, loja_codigo))
 
 
 @router.post("/pedidos-venda", tags=["pedidos"])
@@ -2999,7 +4041,9 @@ async def listar_pedidos_venda(
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    return await run_in_threadpool(_listar_pedidos_sync, limit, cliente_id, status, loja_codigo)
+    return _json_bytes_response(
+        await _run_orm_read(_listar_pedidos_json, limit, cliente_id, status, loja_codigo)
+    )
 
 
 @router.get("/pedidos-venda/{pedido_id}", tags=["pedidos"])
@@ -3008,7 +4052,7 @@ async def detalhar_pedido_venda(
     token: dict = Depends(require_jwt),
     loja_codigo: str = Depends(require_tenant),
 ):
-    return await run_in_threadpool(_get_pedido_sync, pedido_id, loja_codigo)
+    return _json_bytes_response(await _run_orm_read(_get_pedido_json, pedido_id, loja_codigo))
 
 
 app.include_router(router)
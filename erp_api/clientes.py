@@ -9,6 +9,9 @@ router = APIRouter(prefix="/api/clientes", tags=["clientes"])
 logger = logging.getLogger("erp_api.clientes")
 CLIENTES_LOJA_GLOBAL = (os.getenv("CLIENTES_LOJA_GLOBAL") or "").strip().lower() in ("1", "true", "yes", "on")
 CLIENTES_LOJA_GLOBAL_CODE = (os.getenv("CLIENTES_LOJA_GLOBAL_CODE") or "00000").strip() or "00000"
+# Incrementado a cada sincronização concluída; entra na chave dos caches de
+# leitura (ex.: contagem de clientes) para invalidá-los neste processo.
+sync_generation = 0
 
 
 class ClienteSync(BaseModel):
@@ -459,6 +462,8 @@ def sync_clientes(clientes: List[ClienteSync], request: Request):
                     )
 
         conn.commit()
+        global sync_generation
+        sync_generation += 1
         return {"status": "ok", "total": len(clientes)}
 
     except Exception as exc:
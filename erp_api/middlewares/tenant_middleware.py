@@ -1,17 +1,15 @@
 import os
-import jwt
 import logging
+import time
 
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from urllib.parse import urlparse
 
 logger = logging.getLogger("erp_api.tenant")
 
 APP_INTEGRATION_TOKEN = (os.getenv("APP_INTEGRATION_TOKEN") or "").strip()
-JWT_SECRET = os.getenv("JWT_SECRET", "change-me")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 APP_TENANT = (os.getenv("APP_TENANT") or "").strip()
 LOJA_CODIGO = (os.getenv("LOJA_CODIGO") or "").strip()
 APP_DOMAIN = (
@@ -20,6 +18,10 @@ APP_DOMAIN = (
     or os.getenv("APP_TENANT_DOMAIN")
     or ""
 )
+# domínio -> (válido até, loja ou None). dominios_lojas muda raramente.
+TENANT_DOMAIN_CACHE_TTL = float(os.getenv("TENANT_DOMAIN_CACHE_TTL", "60"))
+TENANT_DOMAIN_CACHE_MAX_SIZE = 1024
+_domain_loja_cache: dict[str, tuple[float, str | None]] = {}
 
 
 def _extract_domain(value: str | None) -> str:
@@ -70,32 +72,51 @@ def _token_matches_app_token(request: Request) -> bool:
     return False
 
 
-def _token_is_valid_jwt(request: Request) -> bool:
-    raw_token = ""
-    auth_header = (request.headers.get("authorization") or "").strip()
-    if auth_header:
-        scheme, _, raw_value = auth_header.partition(" ")
-        if scheme.lower() != "bearer" or not raw_value.strip():
-            return False
-        raw_token = raw_value.strip()
-    else:
-        raw_token = (request.headers.get("x-app-token") or "").strip()
-        if not raw_token:
-            return False
-    try:
-        jwt.decode(raw_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        return False
-    except jwt.InvalidTokenError:
-        return False
-    return True
-
-
-class TenantMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            return await call_next(request)
-
+async def _loja_for_domain(pool, domain: str) -> str | None:
+    now = time.time()
+    cached = _domain_loja_cache.get(domain)
+    if cached and cached[0] > now:
+        return cached[1]
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT loja_codigo
+            FROM dominios_lojas
+            WHERE dominio = $1 AND ativo = TRUE
+            LIMIT 1
+            """,
+            domain,
+        )
+    loja = row["loja_codigo"] if row else None
+    if TENANT_DOMAIN_CACHE_TTL > 0:
+        if len(_domain_loja_cache) >= TENANT_DOMAIN_CACHE_MAX_SIZE:
+            _domain_loja_cache.clear()
+        _domain_loja_cache[domain] = (now + TENANT_DOMAIN_CACHE_TTL, loja)
+    return loja
+
+
+class TenantMiddleware:
+    """Resolve a loja da requisição (request.state.loja_codigo).
+
+    Middleware ASGI puro: sem o BaseHTTPMiddleware não há task extra nem cópia
+    do corpo da resposta por requisição.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        response = await self._resolve_tenant(request)
+        if response is not None:
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _resolve_tenant(self, request: Request) -> JSONResponse | None:
         host = request.headers.get("host")
         forwarded_host = request.headers.get("x-forwarded-host")
         origin = request.headers.get("origin") or request.headers.get("referer")
@@ -116,21 +137,10 @@ class TenantMiddleware(BaseHTTPMiddleware):
 
         loja_from_domain = None
         if request_domain:
-            pool = getattr(request.app.state, "data_pool", None)
+            pool = getattr(request.app.state, "read_pool", None) or getattr(request.app.state, "data_pool", None)
             if pool:
                 try:
-                    async with pool.acquire() as conn:
-                        row = await conn.fetchrow(
-                            """
-                            SELECT loja_codigo
-                            FROM dominios_lojas
-                            WHERE dominio = $1 AND ativo = TRUE
-                            LIMIT 1
-                            """,
-                            request_domain,
-                        )
-                    if row:
-                        loja_from_domain = row["loja_codigo"]
+                    loja_from_domain = await _loja_for_domain(pool, request_domain)
                 except Exception:
                     logger.exception("Falha ao resolver loja pelo domínio %s", request_domain)
 
@@ -150,4 +160,4 @@ class TenantMiddleware(BaseHTTPMiddleware):
             )
 
         request.state.loja_codigo = loja_codigo
-        return await call_next(request)
+        return None
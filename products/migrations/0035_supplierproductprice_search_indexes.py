@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def create_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        # icontains (ILIKE '%...%') das telas de custos usa estes índices
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS products_supplierproductprice_code_trgm
+            ON products_supplierproductprice USING gin (code gin_trgm_ops);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS products_supplierproductprice_description_trgm
+            ON products_supplierproductprice USING gin (description gin_trgm_ops);
+        """)
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS products_supplierproductprice_code_trgm;")
+        cursor.execute("DROP INDEX IF EXISTS products_supplierproductprice_description_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0034_auto_20251224_1737'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplierproductprice',
+            index=models.Index(fields=['code', 'id'], name='products_spp_code_id_idx'),
+        ),
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
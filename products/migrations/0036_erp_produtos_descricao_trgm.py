@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+# Tabelas lidas por GET /api/products/search (descricao_completa ILIKE '%q%').
+SEARCH_TABLES = ("erp_produtos", "erp_produtos_sync")
+
+
+def create_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        for table in SEARCH_TABLES:
+            # erp_produtos só existe nas bases com o cadastro separado por loja.
+            cursor.execute("SELECT to_regclass(%s);", [table])
+            if cursor.fetchone()[0] is None:
+                continue
+            cursor.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {table}_descricao_trgm
+                ON {table} USING gin (descricao_completa gin_trgm_ops);
+                """
+            )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        for table in SEARCH_TABLES:
+            cursor.execute(f"DROP INDEX IF EXISTS {table}_descricao_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0035_supplierproductprice_search_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
@@ -1,6 +1,5 @@
 from decimal import Decimal, ROUND_HALF_UP
 from django.db import models
-import re
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -361,6 +360,10 @@ class SupplierProductPrice(models.Model):
 		unique_together = (
 			('supplier', 'code', 'valid_from'),
 		)
+		indexes = [
+			# Busca por código (lote de custos) e paginação por cursor (code, id).
+			models.Index(fields=['code', 'id'], name='products_spp_code_id_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.supplier} - {self.code} ({self.valid_from:%d/%m/%Y})"
@@ -504,8 +507,8 @@ class Product(models.Model):
 			s = str(code).strip()
 			if s == '':
 				return None
-			# numeric-only (allow leading zeros)
-			if re.fullmatch(r"0*[0-9]+", s):
+			# numeric-only (allow leading zeros); isascii+isdigit == fullmatch(r"[0-9]+") sem regex
+			if s.isascii() and s.isdigit():
 				# preserve 0 if the value is actually zero
 				try:
 					return str(int(s))
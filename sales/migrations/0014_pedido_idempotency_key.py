@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0013_order_loja_codigo_orderitem_loja_codigo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 do pedido recebido pela API; impede gravar o mesmo pedido duas vezes.', max_length=64, null=True, unique=True, verbose_name='Chave de idempotência'),
+        ),
+    ]
@@ -280,6 +280,15 @@ class Pedido(models.Model):
 	loja_codigo = models.CharField(_('Loja'), max_length=10, default='00001')
 	vendedor_codigo = models.CharField(_('Código do vendedor'), max_length=50, blank=True)
 	vendedor_nome = models.CharField(_('Nome do vendedor'), max_length=150, blank=True)
+	idempotency_key = models.CharField(
+		_('Chave de idempotência'),
+		max_length=64,
+		unique=True,
+		null=True,
+		blank=True,
+		editable=False,
+		help_text=_('SHA-256 do pedido recebido pela API; impede gravar o mesmo pedido duas vezes.'),
+	)
 
 	class Meta:
 		verbose_name = _('Pedido (API)')
@@ -1,14 +1,17 @@
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
 from django.urls import reverse
 
-from clients.models import Client
+from clients.models import Client, ClienteSync
 from companies.models import Company
 from core.models import UserAccessProfile
-from products.models import Product, ProductStock
-from .models import Quote, QuoteItem, Order, OrderItem, Salesperson
+from products.models import Product, ProductStock, ProdutoSync
+from .models import Quote, QuoteItem, Order, OrderItem, Pedido, ItemPedido, Salesperson
 
 
 class SalesTestCase(TestCase):
@@ -143,3 +146,95 @@ class SalesTestCase(TestCase):
 		})
 		self.assertEqual(response.status_code, 302)
 		self.assertTrue(Salesperson.objects.filter(user=self.user).exists())
+
+	def test_pedido_idempotency_key_is_unique(self):
+		now = timezone.now()
+		Pedido.objects.create(cliente=self.client_user, data_criacao=now, total=Decimal('1.00'))
+		Pedido.objects.create(cliente=self.client_user, data_criacao=now, total=Decimal('1.00'))
+		Pedido.objects.create(cliente=self.client_user, data_criacao=now, total=Decimal('1.00'), idempotency_key='a' * 64)
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			Pedido.objects.create(cliente=self.client_user, data_criacao=now, total=Decimal('1.00'), idempotency_key='a' * 64)
+		self.assertEqual(Pedido.objects.count(), 3)
+
+
+class PedidoApiTests(TransactionTestCase):
+	"""Criação de pedidos pela API (erp_api) sobre o ORM.
+
+	erp_produtos_sync não é gerenciada pelo Django: a tabela é criada aqui.
+	"""
+
+	def setUp(self):
+		with connection.schema_editor() as editor:
+			editor.create_model(ProdutoSync)
+		self.addCleanup(self._drop_model, ProdutoSync)
+		self.cliente = Client.objects.create(person_type='F', document='12345678901', first_name='Ana', email='ana@example.com')
+
+	def _drop_model(self, model):
+		with connection.schema_editor() as editor:
+			editor.delete_model(model)
+
+	def test_resolve_produtos_follows_product_default_ordering(self):
+		from erp_api import _resolve_produtos
+
+		Product.objects.create(name='Primeiro', code='P1', reference='REF2', plu_code='123', price=Decimal('1.00'))
+		segundo = Product.objects.create(name='Segundo', code='P2', reference='REF1', plu_code='123', price=Decimal('1.00'))
+		# Mesma escolha do antigo Product.objects.filter(plu_code__in=...).first().
+		self.assertEqual(_resolve_produtos(['123'])['123'], segundo)
+
+	def _pedido_payload(self):
+		from erp_api import PedidoIn
+
+		return PedidoIn(
+			data_criacao=timezone.now(),
+			total=Decimal('20.00'),
+			cliente_id=str(self.cliente.pk),
+			itens=[{'codigo_produto': 'PX', 'quantidade': '2', 'valor_unitario': '10.00'}],
+		)
+
+	def test_create_pedido_twice_returns_existing_pedido(self):
+		from erp_api import _create_pedido_sync
+
+		Product.objects.create(name='Produto X', code='PX', price=Decimal('10.00'))
+		payload = self._pedido_payload()
+		pedido, created = _create_pedido_sync(payload, '00001')
+		self.assertTrue(created)
+		# O reenvio tem a mesma idempotency_key: o INSERT bate no índice único
+		# e o fallback do IntegrityError devolve o pedido já gravado.
+		again, created_again = _create_pedido_sync(payload, '00001')
+		self.assertFalse(created_again)
+		self.assertEqual(again.pk, pedido.pk)
+		self.assertEqual(Pedido.objects.count(), 1)
+		self.assertEqual(ItemPedido.objects.count(), 1)
+		self.assertEqual(len(pedido.idempotency_key), 64)
+
+	def test_create_pedido_reraises_integrity_error_without_existing_pedido(self):
+		from erp_api import _create_pedido_sync
+
+		Product.objects.create(name='Produto X', code='PX', price=Decimal('10.00'))
+		with mock.patch.object(ItemPedido.objects, 'bulk_create', side_effect=IntegrityError('falha')):
+			with self.assertRaises(IntegrityError):
+				_create_pedido_sync(self._pedido_payload(), '00001')
+		self.assertEqual(Pedido.objects.count(), 0)
+
+	def test_default_consumer_is_recreated_after_delete(self):
+		from erp_api import _resolve_cliente
+
+		consumidor = _resolve_cliente('0')
+		self.assertEqual(_resolve_cliente('0').pk, consumidor.pk)
+		consumidor.delete()
+		novo = _resolve_cliente('0')
+		self.assertNotEqual(novo.pk, consumidor.pk)
+		self.assertTrue(Client.objects.filter(pk=novo.pk).exists())
+
+	def test_unicode_digit_cliente_id_is_not_found(self):
+		from fastapi import HTTPException
+		from erp_api import _resolve_cliente
+
+		# O fallback consulta o staging erp_clientes_vendedores_view, também não gerenciado.
+		with connection.schema_editor() as editor:
+			editor.create_model(ClienteSync)
+		self.addCleanup(self._drop_model, ClienteSync)
+		self.assertEqual(_resolve_cliente(str(self.cliente.pk)).pk, self.cliente.pk)
+		with self.assertRaises(HTTPException) as ctx:
+			_resolve_cliente('²')
+		self.assertEqual(ctx.exception.status_code, 400)